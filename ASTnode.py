@@ -1,54 +1,143 @@
+import io
 import ply.yacc as yacc
-from graphviz import Digraph
+
+# pure punctuation nodes, left out of the compact AST
+punctuation = ("LPAREN", "RPAREN", "LBRACE", "RBRACE", "COMMA", "SEMICOLON")
+
+# named children of each node type, as (position, expected nodetype) among the children that
+# are not punctuation, so the same role works for the full and the compact AST; an expected
+# nodetype marks an optional child, returned only when the child at that position matches it
+roles = {
+    "program": {"functions": (0, "function_list")},
+    "function": {"name": (0, None), "params": (1, "param"), "body": (-1, "commands")},
+    "assignment_expression": {"target": (0, None), "expr": (2, None)},
+    "increment_expression": {"target": (0, None), "operator": (1, None)},
+    "binary_expression": {"left": (0, None), "right": (2, None)},
+    "logical_expression": {"left": (0, None), "right": (2, None)},
+    "relational_expression": {"left": (0, None), "right": (2, None)},
+    "return_expression": {"expr": (1, None)},
+    "call_function_expression": {"name": (0, None), "args": (1, "expression_list")},
+    "declaration": {"type": (0, None), "declarations": (1, None)},
+    "declarations": {
+        "name": (0, "identifier"),
+        "assign": (1, "atribuition"),
+        "init": (2, None),
+        "next": (-1, "declarations"),
+    },
+    "param": {"type": (0, "type"), "name": (1, "identifier"), "next": (2, "param")},
+    "print": {"keyword": (0, None), "expr": (1, None)},
+    "read": {"target": (0, None)},
+    "if": {"condition": (0, None), "then": (1, None), "else": (3, "commands")},
+    "while": {"condition": (0, None), "body": (1, None)},
+    "for": {"init": (0, None), "condition": (1, None), "step": (2, None), "body": (3, None)},
+}
+
+
+def without_punctuation(children):
+    for child in children:
+        if child.nodetype in punctuation:
+            return [child for child in children if child.nodetype not in punctuation]
+    return children
 
 
 class ASTnode:
+    # symbol is the binding of an identifier node, set when its declaration or first use is resolved,
+    # and expr_type the type of an expression node, set by semantic_analyzer.evaluate_expr_type();
+    # role_children caches the children child() indexes (see there)
+    __slots__ = ("nodetype", "children", "value", "lineno", "symbol", "expr_type", "role_children")
+
     def __init__(self, nodetype, children=None, value=None, lineno=None):
         self.nodetype = nodetype
         self.children = children if children is not None else []
         self.lineno = lineno
         self.value = value
-        self.childnum = len(self.children)
-
-    def __repr__(self, level=0):
-        indent = "  " * level
-        ret = f"{indent}{self.nodetype}"
-        if self.value is not None:
-            ret += f": {self.value}"
-        if self.lineno is not None:
-            ret += f" (Line {self.lineno})"
-        ret += "\n"
-
-        for child in self.children:
-            if isinstance(child, ASTnode):
-                ret += child.__repr__(level + 1)
-            else:
-                ret += "  " * (level + 1) + repr(child) + "\n"
-        return ret
-
-    def to_graphviz(self, dot=None, parent=None, counter=None):
-        if dot is None:
-            dot = Digraph()
-            dot.attr(rankdir="TB")
-            counter = [0]
-
-        node_id = f"node{counter[0]}"
-        label = f"{self.nodetype}"
-        if self.value is not None:
-            label += f"\\n{self.value}"
-        dot.node(node_id, label)
-        counter[0] += 1
-
-        if parent is not None:
-            dot.edge(parent, node_id)
-
-        for child in self.children:
-            if isinstance(child, ASTnode):
-                child.to_graphviz(dot, node_id, counter)
-            else:
-                child_id = f"node{counter[0]}"
-                dot.node(child_id, str(child))
-                dot.edge(node_id, child_id)
-                counter[0] += 1
+        self.symbol = None
+        self.expr_type = None
+        self.role_children = None
+
+    def child(self, role):
+        """Returns the child playing the given role (see roles), or None if it is absent"""
+        position, expected = roles[self.nodetype][role]
+        # the children without punctuation are listed once per list of children (a pass that
+        # rewrites the node assigns a new list), and are the list itself in a compact tree
+        cached = self.role_children
+        if cached is None or cached[0] is not self.children:
+            cached = self.role_children = (self.children, without_punctuation(self.children))
+        children = cached[1]
+        if not -len(children) <= position < len(children):
+            return None
+        child = children[position]
+        if expected is not None and child.nodetype != expected:
+            return None
+        return child
+
+    def dump(self, file):
+        """Writes the indented tree to file, one line per node, without recursion"""
+        lines = []
+        stack = [(self, 0)]
+        while stack:
+            node, level = stack.pop()
+            indent = "  " * level
+            if not isinstance(node, ASTnode):
+                lines.append(f"{indent}{node!r}\n")
+                continue
 
+            line = f"{indent}{node.nodetype}"
+            if node.value is not None:
+                line += f": {node.value}"
+            if node.lineno is not None:
+                line += f" (Line {node.lineno})"
+            lines.append(line + "\n")
+            for child in reversed(node.children):
+                stack.append((child, level + 1))
+
+            # written in batches, so memory stays bounded on huge trees
+            if len(lines) >= 4096:
+                file.writelines(lines)
+                lines.clear()
+        file.writelines(lines)
+
+    def __repr__(self):
+        text = io.StringIO()
+        self.dump(text)
+        return text.getvalue()
+
+    def graph(self, max_nodes=None):
+        """Yields (node id, label, parent id) in preorder, stopping after max_nodes nodes"""
+        count = 0
+        stack = [(self, None)]
+        while stack and (max_nodes is None or count < max_nodes):
+            node, parent = stack.pop()
+            node_id = f"node{count}"
+            count += 1
+            if not isinstance(node, ASTnode):
+                yield node_id, str(node), parent
+                continue
+
+            label = f"{node.nodetype}"
+            if node.value is not None:
+                label += f"\n{node.value}"
+            yield node_id, label, parent
+            stack.extend((child, node_id) for child in reversed(node.children))
+
+    def to_graphviz(self, max_nodes=None):
+        # graphviz is only needed when a graph is rendered
+        from graphviz import Digraph
+
+        dot = Digraph()
+        dot.attr(rankdir="TB")
+        for node_id, label, parent in self.graph(max_nodes):
+            dot.node(node_id, label.replace("\n", "\\n"))
+            if parent is not None:
+                dot.edge(parent, node_id)
         return dot
+
+    def write_dot(self, file, max_nodes=None):
+        """Writes the graph in the DOT language, as to_graphviz() would, without graphviz"""
+        file.write("digraph {\n\trankdir=TB\n")
+        for node_id, label, parent in self.graph(max_nodes):
+            label = "\\n".join(part.replace("\\", "\\\\").replace('"', '\\"') for part in label.split("\n"))
+            file.write(f'\t{node_id} [label="{label}"]\n')
+            if parent is not None:
+                file.write(f"\t{parent} -> {node_id}\n")
+        file.write("}\n")
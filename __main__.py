@@ -3,89 +3,73 @@ from argparse import ArgumentParser
 import os, sys
 
 # import project modules
-from tokens import *
-from grammar import *
-from semantic_analyzer import *
-from code_generator import *
-
-
-def read_file(file_name):
-    file = open(file_name, "r")
-
-    return file.read()
-
-
-def print_tokens(lexer, debug):
-    while True:
-        tok = lexer.token()
-        if not tok:
-            break
-        print(tok, file=debug)
-
-
-def print_table(table, debug):
-    for name, symbol in table.symbols.items():
-        print(f"{name}: {symbol}", file=debug)
+from compiler import *
 
 
 def main():
-    # get the CLI (stdout) and debug file name
-    stdout = sys.stdout
-    debug = open(args.debug, "w")
-
-    # instantiate the lexer and run it on the input data
-    lexer = lex.lex()
-    lexer.input(data)
-
-    # print the tokens to the debug file
-    print("Tokens:", file=debug)
-    print_tokens(lexer, debug)
-
-    # reset line number and do the syntax parsing
-    lexer.lineno = 1
-    parser = yacc.yacc(debug=False)
-    syntaxParsing = parser.parse(data, lexer=lexer)
-
-    # print the syntax tree to the debug file
-    print("AST:", file=debug)
-    print(syntaxParsing, file=debug)
-
-    # plot the syntax tree in a graphviz format
-    dot = syntaxParsing.to_graphviz()
-    dot.render("ast", format="png", cleanup=True)
-
-    # get the function list from syntax tree
-    function_list = syntaxParsing.children[1].children
-
-    # define the symbol tables
-    local_tables: list[symbol_table] = []
-    global_table = build_global_table(function_list)
-
-    # print the global table to the debug file
-    print(f"Parent: {global_table.return_parent()}", file=debug)
-    print_table(global_table, debug=debug)
-
-    # itarate through the function list, build local tables and do semantic analysis
-    for function in function_list:
-        local_tables.append(build_local_table(function))
-        semantic_analysis(function, local_tables[-1], global_table)
-
-    # print the local tables to the debug file
-    for table in local_tables:
-        # to get global table function from a local table, do global_table.return_table()[table.return_parent()
-        print(f"Parent: {table.return_parent()}", file=debug)
-        print(f"Details: {global_table.return_table()[table.return_parent()]}", file=debug)
-        print_table(table, debug)
-
-    with open(args.file[:-4] + ".asm", "w") as sys.stdout:
-        generate_code(function_list, local_tables, global_table)
-
-    print("Compilation finished successfully!", file=stdout)
+    if args.batch:
+        success = compile_batch(
+            args.batch,
+            args.lexer,
+            args.jobs,
+            args.debug != os.devnull,
+            args.incremental,
+            args.compact_ast,
+            args.flat_ast,
+            args.max_errors,
+        )
+        sys.exit(0 if success else 1)
+
+    if args.watch:
+        watch(args.watch, args.lexer, args.interval, args.incremental, args.compact_ast, args.flat_ast, args.max_errors)
+        return
+
+    cache = function_cache() if args.incremental else None
+    stats = compile_stats(args.file, args.stats_memory) if args.stats else None
+    try:
+        compile_file(
+            args.file,
+            args.lexer,
+            args.debug,
+            ast_graph=args.ast_graph,
+            cache=cache,
+            compact_ast=args.compact_ast,
+            flat_ast=args.flat_ast,
+            ast_max_nodes=args.ast_max_nodes,
+            stats=stats,
+            max_errors=args.max_errors,
+            analysis_jobs=args.analysis_jobs,
+            codegen_jobs=args.codegen_jobs,
+        )
+    except ErrorsFound:
+        sys.exit(1)
+    print("Compilation finished successfully!")
+    if stats is not None:
+        stats.write(args.stats)
+    if cache is not None:
+        print(f"Function cache: {cache.hits} hits, {cache.misses} misses")
 
 
 if __name__ == "__main__":
     parser = ArgumentParser(description="Compiler for the Por language")
-    parser.add_argument("--file", type=str, required=True, help="Input data file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", type=str, help="Input data file")
+    source.add_argument("--batch", nargs="+", help="Input files or directories to compile in parallel")
+    source.add_argument("--watch", nargs="+", help="Files or directories to recompile whenever they change")
+    parser.add_argument("--interval", type=float, default=0.5, help="Polling interval in seconds for --watch")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for --batch (default: all cores)")
+    parser.add_argument(
+        "--analysis-jobs",
+        type=int,
+        default=1,
+        help="Worker processes analyzing the functions of a --file compilation (not with --incremental)",
+    )
+    parser.add_argument(
+        "--codegen-jobs",
+        type=int,
+        default=1,
+        help="Worker processes generating the code of a --file compilation (not with --incremental)",
+    )
     parser.add_argument(
         "--debug",
         default=os.devnull,
@@ -93,6 +77,47 @@ if __name__ == "__main__":
         const="compile.out",
         help="Enable compile.out file",
     )
+    parser.add_argument(
+        "--ast-graph",
+        type=str,
+        default=None,
+        help="Write the syntax tree graph: a .dot file as text, other extensions (e.g. ast.png) rendered with graphviz",
+    )
+    parser.add_argument(
+        "--ast-max-nodes", type=int, default=None, help="Cut the syntax tree graph after this many nodes"
+    )
+    parser.add_argument(
+        "--stats", type=str, default=None, help="Write a JSON report of the time and memory of each phase"
+    )
+    parser.add_argument(
+        "--stats-memory", action="store_true", help="Trace the peak memory of each phase for --stats (slower)"
+    )
+    parser.add_argument(
+        "--max-errors",
+        type=int,
+        default=1,
+        help="Report up to this many syntax and semantic errors before stopping (0: report them all)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the compilation of unchanged functions from the on-disk cache",
+    )
+    parser.add_argument(
+        "--compact-ast",
+        action="store_true",
+        help="Build the compact AST, without parentheses, braces, commas and semicolons nodes",
+    )
+    parser.add_argument(
+        "--flat-ast",
+        action="store_true",
+        help="Build the AST in flat typed arrays indexed by node id (a compact tree to store or ship, not faster)",
+    )
+    parser.add_argument(
+        "--lexer",
+        choices=["ply", "dfa"],
+        default="ply",
+        help="Lexer engine: PLY regex lexer or table driven DFA lexer",
+    )
     args = parser.parse_args()
-    data = read_file(args.file)
     main()
@@ -0,0 +1,1053 @@
+# benchmarks for the compiler front end
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import contextlib, io, json, math, os, pickle, random, subprocess, sys, tempfile, time, tracemalloc
+
+# import project modules
+from tokens import *
+from grammar import *
+from table_cache import *
+from dfa_lexer import dfa_lexer
+from compiler import analyze_parallel, compile_file, compile_source, function_cache, generate_parallel
+from compile_cache import token_recorder
+from diagnostics import error_log
+from client import send_request
+from flat_ast import ast_arena, flatten
+from constant_folding import fold_constants
+from compile_stats import compile_stats, count_instructions
+from workload import generate_program
+from semantic_analyzer import *
+from code_generator import *
+
+
+def replicate_program(data, times):
+    """Builds a bigger program by repeating the function list of a source file.
+
+    Args:
+        data (str): Source code of a Portugol program.
+        times (int): How many copies of the function list to emit.
+    """
+    start = data.index("{") + 1
+    end = data.rindex("}")
+    body = data[start:end]
+    return data[:start] + body * times + data[end:]
+
+
+def best_of(repeat, func, *args, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def lex_all(lexer, data):
+    lexer.input(data)
+    for _ in iter(lexer.token, None):
+        pass
+
+
+class timed_lexer:
+    """Forwards to a lexer, adding up the time spent in its token() calls"""
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.elapsed = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.lexer, name)
+
+    def input(self, data):
+        self.lexer.input(data)
+
+    def token(self):
+        start = time.perf_counter()
+        tok = self.lexer.token()
+        self.elapsed += time.perf_counter() - start
+        return tok
+
+
+def front_end_twice(lexer, parser, data):
+    # previous pipeline: lex once for the token dump, then lex again inside yacc
+    lex_all(lexer, data)
+    lexer.lexer.lineno = 1
+    return parser.parse(data, lexer=lexer)
+
+
+def front_end_once(lexer, parser, data):
+    # current pipeline: lex once into a token store that is replayed to yacc
+    lexer.input(data)
+    tokens_store = token_store(lexer)
+    return parser.parse(lexer=tokens_store.cursor())
+
+
+def lexing_time(front_end, lexer, parser, repeat, data):
+    """Best total and lexing times of a front end pipeline over repeat runs"""
+    best_total = best_lexing = None
+    for _ in range(repeat):
+        timed = timed_lexer(lexer)
+        start = time.perf_counter()
+        front_end(timed, parser, data)
+        total = time.perf_counter() - start
+        best_total = total if best_total is None else min(best_total, total)
+        best_lexing = timed.elapsed if best_lexing is None else min(best_lexing, timed.elapsed)
+    return best_total, best_lexing
+
+
+def bench_lexing(data, repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+
+    lex_once = best_of(repeat, lex_all, lexer, data)
+    twice, lexing_twice = lexing_time(front_end_twice, lexer, parser, repeat, data)
+    once, lexing_once = lexing_time(front_end_once, lexer, parser, repeat, data)
+
+    print(f"input size:        {len(data)} bytes")
+    print(f"single lex pass:   {lex_once:.4f}s")
+    print(f"lexing, before:    {lexing_twice:.4f}s (dump pass, then again inside the parser)")
+    print(f"lexing, after:     {lexing_once:.4f}s (into the token store)")
+    print(f"front end, before: {twice:.4f}s")
+    print(f"front end, after:  {once:.4f}s")
+
+
+def lex_tuples(lexer, data):
+    lexer.lineno = 1
+    lexer.input(data)
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in iter(lexer.token, None)]
+
+
+def random_source(rng, size):
+    alphabet = 'abEe_019 .+-*/=!<>&|(){}[],;"\n\t'
+    words = list(reserved) + ["1.5", "2E+3", "++", "--", "//", "!=", "=="]
+    pieces = [rng.choice(words) if rng.random() < 0.2 else rng.choice(alphabet) for _ in range(size)]
+    return "".join(pieces)
+
+
+def check_lexers(data, samples=2000, seed=0):
+    """Differential check: the DFA lexer must yield exactly the PLY token stream"""
+    rng = random.Random(seed)
+    inputs = [data] + [random_source(rng, rng.randint(1, 80)) for _ in range(samples)]
+    ply_lexer = build_lexer()
+    table_lexer = dfa_lexer()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for source in inputs:
+            expected = lex_tuples(ply_lexer, source)
+            got = lex_tuples(table_lexer, source)
+            if expected != got:
+                raise SystemExit(f"Lexers disagree on input {source!r}")
+
+    return len(inputs)
+
+
+def bench_lexer(data, repeat):
+    checked = check_lexers(data)
+    print(f"differential check: {checked} inputs, identical token streams")
+
+    megabytes = len(data.encode()) / 1e6
+    ply_time = best_of(repeat, lex_all, build_lexer(), data)
+    dfa_time = best_of(repeat, lex_all, dfa_lexer(), data)
+
+    print(f"input size: {megabytes:.2f} MB")
+    print(f"ply lexer:  {megabytes / ply_time:.2f} MB/s")
+    print(f"dfa lexer:  {megabytes / dfa_time:.2f} MB/s")
+
+
+def traced_size(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_tokens(data):
+    lexer = build_lexer()
+
+    lexer.input(data)
+    token_list, list_size = traced_size(lambda: list(iter(lexer.token, None)))
+
+    lexer.input(data)
+    store, store_size = traced_size(lambda: token_store(lexer))
+
+    print(f"tokens:                {len(store)}")
+    print(f"LexToken list:         {list_size / len(token_list):.1f} bytes/token")
+    print(f"token_store columns:   {store_size / len(store):.1f} bytes/token")
+
+
+def bench_batch(data, files, repeat):
+    with tempfile.TemporaryDirectory() as project:
+        for index in range(files):
+            with open(os.path.join(project, f"program{index}.por"), "w") as file:
+                file.write(data)
+
+        command = [sys.executable, "__main__.py", "--batch", project, "--jobs"]
+        print(f"{files} files of {len(data)} bytes")
+        jobs = 1
+        while jobs <= max(os.cpu_count(), 1):
+            elapsed = best_of(repeat, subprocess.run, command + [str(jobs)], stdout=subprocess.DEVNULL)
+            print(f"jobs {jobs}: {elapsed:.3f}s ({files / elapsed:.1f} files/s)")
+            jobs *= 2
+
+
+INCREMENTAL_FUNCTION = """
+  funcao f{index}(inteiro p) {{
+    inteiro a = {constant}
+    inteiro b = a + p
+    escreva("f{index}")
+    se (a < b) {{
+      a++
+    }}
+    enquanto (a < 10) {{
+      a++
+    }}
+    f{callee}(b)
+  }}
+"""
+
+
+def many_functions(count, edited=None):
+    functions = []
+    for index in range(count):
+        function = INCREMENTAL_FUNCTION.format(index=index, constant=index, callee=(index + 1) % count)
+        if index == edited:
+            # one more line, which moves every function after the edited one
+            function = function.replace("    inteiro b", "    a = a * 2\n    inteiro b")
+        functions.append(function)
+    return "programa {" + "".join(functions) + "}\n"
+
+
+def bench_incremental(functions):
+    with tempfile.TemporaryDirectory() as workdir:
+        file_name = os.path.join(workdir, "program.por")
+        cache = function_cache(os.path.join(workdir, "cache"))
+
+        def compile_program(source, use_cache):
+            with open(file_name, "w") as file:
+                file.write(source)
+            start = time.perf_counter()
+            compile_file(file_name, cache=cache if use_cache else None)
+            elapsed = time.perf_counter() - start
+            with open(file_name[:-4] + ".asm") as file:
+                return elapsed, file.read()
+
+        original = many_functions(functions)
+        edited = many_functions(functions, edited=functions // 2)
+
+        full, _ = compile_program(original, False)
+        cold, _ = compile_program(original, True)
+        cold_counts = (cache.hits, cache.misses)
+        full_edited, expected = compile_program(edited, False)
+        cache.hits = cache.misses = 0
+        warm, got = compile_program(edited, True)
+
+    print(f"{functions} functions, one line added to one of them between the runs")
+    print(f"full compile:                {full:.3f}s")
+    print(f"incremental, empty cache:    {cold:.3f}s ({cold_counts[0]} hits, {cold_counts[1]} misses)")
+    print(f"full compile after the edit: {full_edited:.3f}s")
+    print(f"incremental after the edit:  {warm:.3f}s ({cache.hits} hits, {cache.misses} misses)")
+    print(f"same assembly as a full compile: {got == expected}")
+
+    # the same comparison restricted to the phases the cache replaces, on a fresh tree per run
+    # (the constant folding rewrites it)
+    lexer = build_lexer()
+    parser = build_parser()
+
+    def function_list():
+        lexer.input(edited)
+        recorder = token_recorder(lexer)
+        return parser.parse(lexer=recorder).child("functions").children, recorder
+
+    def back_end(function_list, recorder):
+        errors = error_log()
+        global_table = build_global_table(function_list, errors)
+        local_tables = []
+        for function in function_list:
+            local_tables.append(analyze_function(function, global_table, errors))
+            fold_constants(function, local_tables[-1])
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_code(function_list, local_tables, global_table)
+
+    def back_end_cached(function_list, recorder):
+        global_table = build_global_table(function_list, error_log())
+        keys = cache.token_keys(recorder, function_list, global_table)
+        chunks = [
+            cache.compile_function(function, global_table, key)["chunk"] for function, key in zip(function_list, keys)
+        ]
+        with contextlib.redirect_stdout(io.StringIO()):
+            link_functions(chunks)
+
+    def best_back_end(run):
+        elapsed = []
+        for _ in range(3):
+            functions, recorder = function_list()
+            start = time.perf_counter()
+            run(functions, recorder)
+            elapsed.append(time.perf_counter() - start)
+        return min(elapsed)
+
+    with tempfile.TemporaryDirectory() as path:
+        cache = function_cache(path)
+        back_end_cached(*function_list())
+        print(f"analysis + folding + codegen: {best_back_end(back_end):.3f}s")
+        print(f"same, all functions cached:   {best_back_end(back_end_cached):.3f}s")
+
+
+COLD_COMPILE = """
+import sys
+from compiler import compile_file
+compile_file(sys.argv[1])
+"""
+
+CLIENT_COMPILE = """
+import os, sys
+from client import send_request
+send_request({"cwd": os.getcwd(), "file": sys.argv[1]}, sys.argv[2])
+"""
+
+
+def bench_daemon(source, repeat):
+    with tempfile.TemporaryDirectory() as workdir:
+        file_name = os.path.join(workdir, "program.por")
+        socket_path = os.path.join(workdir, "compiler.sock")
+        with open(file_name, "w") as file:
+            file.write(source)
+
+        server = subprocess.Popen([sys.executable, "server.py", "--socket", socket_path], stdout=subprocess.PIPE)
+        try:
+            server.stdout.readline()  # listening
+            request = {"cwd": workdir, "file": file_name}
+
+            cold = best_of(repeat, run_python_args, COLD_COMPILE, file_name)
+            client = best_of(repeat, run_python_args, CLIENT_COMPILE, file_name, socket_path)
+            round_trip = best_of(repeat, send_request, request, socket_path)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"cold process (python + imports + tables + compile): {cold * 1000:.1f} ms")
+    print(f"client process round trip:                          {client * 1000:.1f} ms")
+    print(f"socket round trip only:                             {round_trip * 1000:.1f} ms")
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def bench_ast(data):
+    lexer = build_lexer()
+    parser = build_parser()
+
+    for compact_ast in (False, True):
+        lexer.lineno = 1
+        lexer.input(data)
+        tokens_store = token_store(lexer)
+        parser.compact = compact_ast
+
+        tracemalloc.start()
+        tree = parser.parse(lexer=tokens_store.cursor())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        mode = "compact AST:" if compact_ast else "full AST:   "
+        print(f"{mode} {count_nodes(tree)} nodes, parse peak {peak / 1e6:.1f} MB")
+        del tree
+
+
+def parse_tree(parser, tokens_store, flat):
+    parser.arena = ast_arena() if flat else None
+    tree = parser.parse(lexer=tokens_store.cursor())
+    arena, parser.arena = parser.arena, None
+    return (arena, tree) if flat else tree
+
+
+def count_identifiers(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += node.nodetype == "identifier"
+        stack.extend(node.children)
+    return count
+
+
+def count_identifiers_flat(arena, root):
+    identifier = arena.kind_index["identifier"]
+    kinds = arena.kinds
+    return sum(1 for node_id in arena.walk(root) if kinds[node_id] == identifier)
+
+
+def bench_flat_ast(data, seed, repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    lexer.lineno = 1
+    lexer.input(data)
+    tokens_store = token_store(lexer)
+
+    tree = parse_tree(parser, tokens_store, False)
+    arena, root = parse_tree(parser, tokens_store, True)
+    assert count_nodes(tree) == len(arena)
+    assert count_identifiers(tree) == count_identifiers_flat(arena, root)
+    print(f"{len(arena)} nodes")
+
+    build = best_of(repeat, parse_tree, parser, tokens_store, False)
+    build_flat = best_of(repeat, parse_tree, parser, tokens_store, True)
+    print(f"construction (parse), object tree: {build * 1000:.0f} ms")
+    print(f"construction (parse), flat arena:  {build_flat * 1000:.0f} ms")
+
+    walk = best_of(repeat, count_identifiers, tree)
+    walk_flat = best_of(repeat, count_identifiers_flat, arena, root)
+    print(f"traversal, object tree:            {walk * 1000:.0f} ms")
+    print(f"traversal, flat arena:             {walk_flat * 1000:.0f} ms")
+
+    del tree, arena
+    for flat in (False, True):
+        tracemalloc.start()
+        tree = parse_tree(parser, tokens_store, flat)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        dumped = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        elapsed = time.perf_counter() - start
+        mode = "flat arena: " if flat else "object tree:"
+        print(f"{mode} resident {size / 1e6:.1f} MB, pickled {len(dumped) / 1e6:.1f} MB in {elapsed * 1000:.0f} ms")
+        del tree, dumped
+
+    bench_flat_passes(parser, seed, repeat)
+
+
+def run_passes(parser, tokens_store, flat):
+    """Times the semantic analysis, constant folding and code generation of a freshly parsed tree"""
+    tree = parse_tree(parser, tokens_store, flat)
+    if flat:
+        arena, root = tree
+        tree = arena.node(root)
+    function_list = tree.child("functions").children
+    global_table = build_global_table(function_list, error_log())
+
+    start = time.perf_counter()
+    local_tables = analyze_functions(function_list, global_table)
+    analysis = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for function, table in zip(function_list, local_tables):
+        fold_constants(function, table)
+    folding = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as null:
+        generate_code(function_list, local_tables, global_table, null)
+    codegen = time.perf_counter() - start
+    return analysis, folding, codegen
+
+
+def bench_flat_passes(parser, seed, repeat):
+    lexer = build_lexer()
+    lexer.lineno = 1
+    lexer.input(generate_program(functions=100, statements=100, depth=3, declarations=10, seed=seed))
+    tokens_store = token_store(lexer)
+    print("passes over a generated program of 100 functions:")
+    for flat in (False, True):
+        runs = [run_passes(parser, tokens_store, flat) for _ in range(repeat)]
+        analysis, folding, codegen = (min(times) for times in zip(*runs))
+        mode = "flat arena: " if flat else "object tree:"
+        print(
+            f"{mode} semantic analysis {analysis * 1000:6.0f} ms, folding {folding * 1000:6.0f} ms, code generation {codegen * 1000:6.0f} ms"
+        )
+
+
+def long_lists(kind, count):
+    """Returns a program with one list of count items: statements, declarations or call arguments"""
+    if kind == "statements":
+        body = "inteiro a\n" + "a = a + 1\n" * count
+    elif kind == "declarations":
+        body = "inteiro " + ", ".join(f"v{i}" for i in range(count)) + "\n"
+    else:
+        body = "f(" + ", ".join(["1"] * count) + ")\n"
+    return f"programa {{\n  funcao inicio() {{\n{body}  }}\n}}\n"
+
+
+def bench_lists(repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+
+    for kind in ("statements", "declarations", "arguments"):
+        for count in (1000, 10000, 100000):
+            lexer.lineno = 1
+            lexer.input(long_lists(kind, count))
+            tokens_store = token_store(lexer)
+            elapsed = best_of(repeat, lambda: parser.parse(lexer=tokens_store.cursor()))
+            print(f"{kind:>12} {count:>7}: {elapsed * 1000:8.1f} ms, {elapsed / count * 1e6:5.2f} us per item")
+
+
+def bench_dump(data, repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+
+    lexer.lineno = 1
+    lexer.input(data)
+    tree = parser.parse(lexer=token_store(lexer).cursor())
+    dump = best_of(repeat, tree.dump, io.StringIO())
+    dot = best_of(repeat, tree.write_dot, io.StringIO())
+    print(f"dump, {count_nodes(tree)} nodes:      {dump * 1000:.0f} ms")
+    print(f"write_dot, {count_nodes(tree)} nodes: {dot * 1000:.0f} ms")
+
+    # declarations nest one node per item, far past the recursion limit (the indentation makes
+    # the dump quadratic in the depth, so the tree is kept at a few thousand levels)
+    lexer.lineno = 1
+    lexer.input(long_lists("declarations", 5000))
+    tree = parser.parse(lexer=token_store(lexer).cursor())
+    text = io.StringIO()
+    dump = best_of(1, tree.dump, text)
+    print(f"dump, 5000 levels deep:  {dump * 1000:.0f} ms, {len(text.getvalue()) / 1e6:.1f} MB")
+
+
+# knob varied by each scaling curve, the values it takes and the changes to the base program
+WORKLOAD_BASE = {"functions": 20, "statements": 50, "depth": 2, "declarations": 10, "fanout": 2}
+WORKLOAD_CURVES = {
+    "functions": ([100, 200, 400, 800], {}),
+    "statements": ([250, 500, 1000, 2000], {}),
+    "depth": ([1, 2, 3, 4, 5], {}),
+    "declarations": ([250, 500, 1000, 2000], {}),
+    "fanout": ([8, 32, 128, 512], {"functions": 600, "statements": 10}),
+}
+CURVE_PHASES = ["lexing", "parsing", "global_table", "semantic_analysis", "code_generation"]
+
+
+def compile_phases(source, repeat):
+    """Compiles source in a temporary directory, returning the phase times of the fastest run"""
+    with tempfile.TemporaryDirectory() as workdir:
+        file_name = os.path.join(workdir, "workload.por")
+        with open(file_name, "w") as file:
+            file.write(source)
+
+        best = None
+        for _ in range(repeat):
+            stats = compile_stats(file_name)
+            compile_file(file_name, stats=stats)
+            report = stats.report()
+            if best is None or report["total"]["wall_s"] < best["total"]["wall_s"]:
+                best = report
+        return best
+
+
+def growth(sizes, times):
+    """Least squares slope of log(time) over log(size): ~1 is linear, ~2 quadratic"""
+    points = [(math.log(size), math.log(time)) for size, time in zip(sizes, times) if time > 0]
+    if len(points) < 2:
+        return float("nan")
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def bench_phases(repeat, seed, json_name=None):
+    compile_phases(generate_program(seed=seed), 1)  # warm the lexer and parser
+    curves = {}
+
+    for knob, (values, changes) in WORKLOAD_CURVES.items():
+        base = dict(WORKLOAD_BASE, **changes)
+        print(f"{knob} (others at {', '.join(f'{k}={v}' for k, v in base.items() if k != knob)}):")
+        print(f"  {knob:>12} {'tokens':>8} " + " ".join(f"{phase[:12]:>12}" for phase in CURVE_PHASES) + "  (ms)")
+        points = []
+        for value in values:
+            config = dict(base, **{knob: value})
+            report = compile_phases(generate_program(seed=seed, **config), repeat)
+            times = [report["phases"][phase]["wall_s"] for phase in CURVE_PHASES]
+            points.append({"value": value, **report})
+            row = " ".join(f"{time * 1000:12.1f}" for time in times)
+            print(f"  {value:>12} {report['counters']['tokens']:>8} {row}")
+
+        # growth against the program size, so curves of different knobs compare
+        sizes = [point["counters"]["tokens"] for point in points]
+        slopes = [growth(sizes, [point["phases"][phase]["wall_s"] for point in points]) for phase in CURVE_PHASES]
+        print(f"  {'growth':>12} {'':>8} " + " ".join(f"{slope:12.2f}" for slope in slopes))
+        curves[knob] = points
+
+    if json_name is not None:
+        with open(json_name, "w") as file:
+            json.dump({"base": WORKLOAD_BASE, "seed": seed, "curves": curves}, file, indent=2)
+
+
+def bench_locals(repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+
+    for count in (1000, 10000, 100000):
+        body = "".join(f"inteiro v{index} = {index}\n" for index in range(count))
+        lexer.lineno = 1
+        lexer.input(f"programa {{\n  funcao inicio() {{\n{body}  }}\n}}\n")
+        tree = parser.parse(lexer=token_store(lexer).cursor())
+        function = tree.child("functions").children[0]
+
+        global_table = build_global_table([function], error_log())
+        table = analyze_function(function, global_table, error_log())
+        build = best_of(repeat, analyze_function, function, global_table, error_log())
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate = best_of(repeat, generate_code, [function], [table], global_table)
+        print(
+            f"{count:>7} locals: local table {build * 1000:8.1f} ms ({build / count * 1e6:5.2f} us per local), "
+            f"code {generate * 1000:8.1f} ms ({generate / count * 1e6:5.2f} us per local)"
+        )
+
+
+# functions of semantic_analyzer that visit AST nodes, counted by bench_visits
+VISITORS = {
+    "semantic_analysis",
+    "analyze_function",
+    "analyze_block",
+    "declarations_extract",
+    "params_extract",
+    "args_extract",
+    "evaluate_expr_type",
+    "expression_type",
+}
+
+
+def count_visits(func, *args):
+    """Runs func, returning its result and the calls of semantic_analyzer visitors it made"""
+    visits = {}
+    analyzer_file = sys.modules["semantic_analyzer"].__file__
+
+    def profile(frame, event, arg):
+        code = frame.f_code
+        if event == "call" and code.co_filename == analyzer_file and code.co_name in VISITORS:
+            visits[code.co_name] = visits.get(code.co_name, 0) + 1
+
+    sys.setprofile(profile)
+    try:
+        result = func(*args)
+    finally:
+        sys.setprofile(None)
+    return result, visits
+
+
+def analyze_functions(function_list, global_table):
+    errors = error_log()
+    return [analyze_function(function, global_table, errors) for function in function_list]
+
+
+def bench_visits(seed, repeat):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+    lexer.lineno = 1
+    lexer.input(generate_program(functions=100, statements=100, depth=3, declarations=20, fanout=4, seed=seed))
+    tokens_store = token_store(lexer)
+
+    # fresh trees, as the analysis annotates the nodes it visits
+    trees = [parser.parse(lexer=tokens_store.cursor()) for _ in range(repeat + 1)]
+    function_lists = [tree.child("functions").children for tree in trees]
+    global_table = build_global_table(function_lists[0], error_log())
+    nodes = count_nodes(trees[0])
+
+    _, visits = count_visits(analyze_functions, function_lists[0], global_table)
+    elapsed = min(best_of(1, analyze_functions, function_list, global_table) for function_list in function_lists[1:])
+    total = sum(visits.values())
+    print(f"{total} visitor calls, {total / nodes:.3f} per AST node ({nodes} nodes), {elapsed * 1000:.1f} ms")
+    for visitor, count in sorted(visits.items(), key=lambda item: -item[1]):
+        print(f"    {visitor:>22} {count:>8}")
+
+
+def table_rows(tables):
+    return [[(name, f"{symbol}") for name, symbol in table.symbols.items()] for table in tables]
+
+
+def bench_parallel_analysis(seed, repeat, workers):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+    lexer.lineno = 1
+    lexer.input(generate_program(functions=200, statements=200, depth=3, declarations=20, fanout=4, seed=seed))
+    tokens_store = token_store(lexer)
+
+    # fresh trees, as the analysis annotates the nodes it visits: the first one is only analyzed
+    # by the forked workers (on their copy of it), the other ones by the sequential runs
+    trees = [parser.parse(lexer=tokens_store.cursor()) for _ in range(repeat + 1)]
+    function_lists = [tree.child("functions").children for tree in trees]
+    function_list = function_lists[0]
+    global_table = build_global_table(function_list, error_log())
+
+    sequential = []
+    for other in function_lists[1:]:
+        start = time.perf_counter()
+        tables = analyze_functions(other, global_table)
+        sequential.append(time.perf_counter() - start)
+    expected = table_rows(tables)
+    sequential = min(sequential)
+    ship = best_of(repeat, lambda: pickle.dumps([flatten(function, ast_arena()) for function in function_list]))
+    print(f"{len(function_list)} functions, {count_nodes(trees[0])} nodes, {os.cpu_count()} core(s)")
+    print(f"    sequential:            {sequential * 1000:8.1f} ms")
+    print(f"    shipping the subtrees: {ship * 1000:8.1f} ms (flatten + pickle, not needed with fork)")
+
+    for jobs in workers:
+        run = lambda: [table for table, _ in analyze_parallel(function_list, global_table, jobs)]
+        if table_rows(run()) != expected:
+            raise AssertionError(f"{jobs} workers: local tables differ from the sequential analysis")
+        elapsed = best_of(repeat, run)
+        print(f"    {jobs} worker(s):          {elapsed * 1000:8.1f} ms ({sequential / elapsed:.2f}x)")
+
+
+def bench_parallel_codegen(seed, repeat, workers):
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+    lexer.lineno = 1
+    lexer.input(generate_program(functions=200, statements=200, depth=3, declarations=20, fanout=4, seed=seed))
+    tree = parser.parse(lexer=lexer)
+    function_list = tree.child("functions").children
+    global_table = build_global_table(function_list, error_log())
+    local_tables = analyze_functions(function_list, global_table)
+
+    def sequential():
+        output = io.StringIO()
+        generate_code(function_list, local_tables, global_table, output)
+        return output.getvalue()
+
+    def parallel(jobs):
+        output = io.StringIO()
+        generate_parallel(function_list, local_tables, global_table, jobs, output)
+        return output.getvalue()
+
+    expected = sequential()
+    elapsed = best_of(repeat, sequential)
+    chunks = [
+        generate_chunk(function_list[start : start + 10], local_tables[start : start + 10], global_table)
+        for start in range(0, len(function_list), 10)
+    ]
+    link = best_of(repeat, lambda: link_functions(chunks, io.StringIO()))
+    print(f"{len(function_list)} functions, {len(expected) / 1e6:.1f} MB of assembly, {os.cpu_count()} core(s)")
+    print(f"    sequential:          {elapsed * 1000:8.1f} ms")
+    print(f"    linking 20 chunks:   {link * 1000:8.1f} ms")
+    for jobs in workers:
+        if parallel(jobs) != expected:
+            raise AssertionError(f"{jobs} workers: the assembly differs from the sequential one")
+        parallel_elapsed = best_of(repeat, parallel, jobs)
+        print(f"    {jobs} worker(s):        {parallel_elapsed * 1000:8.1f} ms ({elapsed / parallel_elapsed:.2f}x)")
+
+
+def bench_emit(seed, repeat):
+    source = generate_program(functions=200, statements=200, depth=3, declarations=20, fanout=4, seed=seed)
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+    lexer.lineno = 1
+    lexer.input(source)
+    tree = parser.parse(lexer=lexer)
+    function_list = tree.child("functions").children
+    global_table = build_global_table(function_list, error_log())
+    local_tables = analyze_functions(function_list, global_table)
+
+    output = io.StringIO()
+    generate_code(function_list, local_tables, global_table, output)
+    instructions = count_instructions(output.getvalue())
+    size = len(output.getvalue())
+    del output
+
+    with open(os.devnull, "w") as null:
+        elapsed = best_of(repeat, generate_code, function_list, local_tables, global_table, null)
+    print(f"{instructions} instructions, {size / 1e6:.1f} MB of assembly")
+    print(f"    emission: {elapsed * 1000:8.1f} ms, {instructions / elapsed / 1e6:.2f} M instructions/s")
+
+    # peak memory of the code generation and of the write of the .asm file, first written then unchanged
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "emit.por")
+        with open(file_name, "w") as file:
+            file.write(source)
+        for run in ("written", "unchanged"):
+            stats = compile_stats(file_name, trace_memory=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                compile_file(file_name, stats=stats)
+            phases = stats.write(os.path.join(directory, "stats.json"))["phases"]
+            peaks = ", ".join(
+                f"{name} {phases[name]['peak_traced_bytes'] / 1e6:6.1f} MB" for name in ("code_generation", "write")
+            )
+            print(f"    peak memory, .asm {run:>9}: {peaks}")
+
+
+def fold_program(lexer, parser, program):
+    """Returns the instructions of a program without and with constant folding, the folded nodes and the folding time"""
+    lexer.lineno = 1
+    lexer.input(program)
+    function_list = parser.parse(lexer=lexer).child("functions").children
+    global_table = build_global_table(function_list, error_log())
+    local_tables = analyze_functions(function_list, global_table)
+
+    output = io.StringIO()
+    generate_code(function_list, local_tables, global_table, output)
+    before = count_instructions(output.getvalue())
+
+    start = time.perf_counter()
+    folded = sum(fold_constants(function, table) for function, table in zip(function_list, local_tables))
+    elapsed = time.perf_counter() - start
+
+    output = io.StringIO()
+    generate_code(function_list, local_tables, global_table, output)
+    return before, count_instructions(output.getvalue()), folded, elapsed
+
+
+def bench_fold(name, source, seed):
+    corpus = [(name, source), ("incremental, 200 functions", many_functions(200))]
+    for index in range(3):
+        corpus.append(
+            (
+                f"generated, seed {seed + index}",
+                generate_program(functions=50, statements=50, depth=3, seed=seed + index),
+            )
+        )
+    corpus.append(("generated, depth 5", generate_program(functions=50, statements=50, depth=5, seed=seed)))
+
+    lexer = build_lexer()
+    parser = build_parser()
+    parser.compact = False
+    parser.arena = None
+    totals = [0, 0]
+    print(f"{'program':<28} {'before':>8} {'after':>8} {'saved':>7} {'folded':>7} {'fold time':>10}")
+    for name, program in corpus:
+        before, after, folded, elapsed = fold_program(lexer, parser, program)
+        totals[0] += before
+        totals[1] += after
+        print(f"{name:<28} {before:8} {after:8} {1 - after / before:7.1%} {folded:7} {elapsed * 1000:7.1f} ms")
+    print(f"{'total':<28} {totals[0]:8} {totals[1]:8} {1 - totals[1] / totals[0]:7.1%}")
+
+
+def compile_programs_files(file_names):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for file_name in file_names:
+            compile_file(file_name)
+    asm = []
+    for file_name in file_names:
+        with open(file_name[:-4] + ".asm", "r") as file:
+            asm.append(file.read())
+    return asm
+
+
+def compile_programs_threads(programs, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [result.asm for result in pool.map(compile_source, programs)]
+
+
+def bench_api(seed, repeat, count, workers):
+    programs = [
+        generate_program(functions=3, statements=10, declarations=3, seed=seed + index) for index in range(count)
+    ]
+    compile_source(programs[0])  # warm the lexer and parser
+    print(f"{count} programs of {sum(map(len, programs)) / count:.0f} bytes on average")
+
+    # the compiler driven through files, as the command line does it, against compile_source
+    with tempfile.TemporaryDirectory() as directory:
+        file_names = []
+        for index, program in enumerate(programs):
+            file_names.append(os.path.join(directory, f"program{index}.por"))
+            with open(file_names[-1], "w") as file:
+                file.write(program)
+        expected = compile_programs_files(file_names)
+        elapsed = best_of(repeat, compile_programs_files, file_names)
+    print(f"compile_file, .por/.asm files: {elapsed * 1000:8.1f} ms, {count / elapsed:7.1f} compiles/s")
+
+    assert [result.asm for result in map(compile_source, programs)] == expected
+    elapsed = best_of(repeat, lambda: [compile_source(program) for program in programs])
+    print(f"compile_source, in memory:     {elapsed * 1000:8.1f} ms, {count / elapsed:7.1f} compiles/s")
+
+    # the threads share the process (and its lock on the interpreter), each with its own lexer and parser
+    for threads in workers:
+        assert compile_programs_threads(programs, threads) == expected
+        elapsed = best_of(repeat, compile_programs_threads, programs, threads)
+        print(f"compile_source, {threads} thread(s):  {elapsed * 1000:8.1f} ms, {count / elapsed:7.1f} compiles/s")
+
+
+STARTUP_UNCACHED = """
+import ply.lex as lex, ply.yacc as yacc, grammar, tokens
+lex.lex(module=tokens)
+yacc.yacc(module=grammar, debug=False, write_tables=False, errorlog=yacc.NullLogger())
+"""
+
+STARTUP_CACHED = """
+from table_cache import *
+build_lexer()
+build_parser()
+"""
+
+
+def run_python(code, env=None):
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def run_python_args(code, *args):
+    subprocess.run([sys.executable, "-c", code, *args], check=True)
+
+
+MEMORY_WHOLE_FILE = """
+import resource, sys
+from dfa_lexer import dfa_lexer
+from source_reader import read_file
+lexer = dfa_lexer()
+lexer.input(read_file(sys.argv[1]))
+count = sum(1 for _ in iter(lexer.token, None))
+print(count, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+MEMORY_STREAMING = """
+import resource, sys
+from dfa_lexer import dfa_lexer
+from source_reader import read_chunks
+from tokens import chunked_lexer
+lexer = chunked_lexer(dfa_lexer(), read_chunks(sys.argv[1]))
+count = sum(1 for _ in iter(lexer.token, None))
+print(count, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_memory(code, file_name):
+    result = subprocess.run([sys.executable, "-c", code, file_name], check=True, capture_output=True, text=True)
+    count, maxrss = result.stdout.split()
+    return int(count), int(maxrss) / 1024
+
+
+def bench_memory(data, megabytes):
+    start = data.index("{") + 1
+    end = data.rindex("}")
+    body = data[start:end]
+
+    with tempfile.NamedTemporaryFile("w", suffix=".por") as file:
+        # written piece by piece, so the benchmark process itself stays small
+        file.write(data[:start])
+        for _ in range(max(1, int(megabytes * 1e6) // len(body))):
+            file.write(body)
+        file.write(data[end:])
+        file.flush()
+
+        size = os.path.getsize(file.name) / 1e6
+        whole_tokens, whole_rss = peak_memory(MEMORY_WHOLE_FILE, file.name)
+        stream_tokens, stream_rss = peak_memory(MEMORY_STREAMING, file.name)
+
+    print(f"input size:           {size:.1f} MB ({whole_tokens} tokens)")
+    print(f"peak RSS, read_file:  {whole_rss:.1f} MB")
+    print(f"peak RSS, streaming:  {stream_rss:.1f} MB ({stream_tokens} tokens)")
+
+
+def bench_startup(repeat):
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, XDG_CACHE_HOME=cache)
+        bare = best_of(repeat, run_python, "import ply.lex, ply.yacc, grammar, tokens")
+        uncached = best_of(repeat, run_python, STARTUP_UNCACHED)
+        cold = best_of(1, run_python, STARTUP_CACHED, env)
+        warm = best_of(repeat, run_python, STARTUP_CACHED, env)
+
+    print(f"interpreter + imports:     {bare:.4f}s")
+    print(f"startup, building tables:  {uncached:.4f}s")
+    print(f"startup, first run:        {cold:.4f}s (tables written to the cache)")
+    print(f"startup, cached tables:    {warm:.4f}s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmarks for the Por compiler")
+    parser.add_argument(
+        "benchmark",
+        choices=[
+            "lexing",
+            "startup",
+            "lexer",
+            "memory",
+            "tokens",
+            "batch",
+            "incremental",
+            "daemon",
+            "ast",
+            "flat-ast",
+            "lists",
+            "dump",
+            "phases",
+            "locals",
+            "visits",
+            "parallel-analysis",
+            "parallel-codegen",
+            "emit",
+            "api",
+            "fold",
+        ],
+        help="Benchmark to run",
+    )
+    parser.add_argument("--file", type=str, default="ex1.por", help="Input data file")
+    parser.add_argument("--scale", type=int, default=500, help="Copies of the input function list")
+    parser.add_argument("--files", type=int, default=64, help="Number of files in the batch benchmark")
+    parser.add_argument("--functions", type=int, default=1000, help="Functions in the incremental benchmark")
+    parser.add_argument("--megabytes", type=int, default=500, help="Size of the memory benchmark input")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated programs")
+    parser.add_argument("--programs", type=int, default=500, help="Small programs compiled by the api benchmark")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Worker counts of the parallel analysis and code generation benchmarks (threads of the api one)",
+    )
+    parser.add_argument("--json", type=str, default=None, help="Also write the phases scaling curves to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.file, "r") as file:
+        source = file.read()
+    data = replicate_program(source, args.scale)
+
+    if args.benchmark == "lexing":
+        bench_lexing(data, args.repeat)
+    elif args.benchmark == "startup":
+        bench_startup(args.repeat)
+    elif args.benchmark == "lexer":
+        bench_lexer(data, args.repeat)
+    elif args.benchmark == "memory":
+        bench_memory(data, args.megabytes)
+    elif args.benchmark == "tokens":
+        bench_tokens(data)
+    elif args.benchmark == "batch":
+        # replicated functions would be redeclarations, so the batch compiles the plain file
+        bench_batch(source, args.files, args.repeat)
+    elif args.benchmark == "incremental":
+        bench_incremental(args.functions)
+    elif args.benchmark == "daemon":
+        bench_daemon(source, args.repeat)
+    elif args.benchmark == "ast":
+        bench_ast(data)
+    elif args.benchmark == "flat-ast":
+        bench_flat_ast(data, args.seed, args.repeat)
+    elif args.benchmark == "lists":
+        bench_lists(args.repeat)
+    elif args.benchmark == "dump":
+        bench_dump(data, args.repeat)
+    elif args.benchmark == "phases":
+        bench_phases(args.repeat, args.seed, args.json)
+    elif args.benchmark == "locals":
+        bench_locals(args.repeat)
+    elif args.benchmark == "visits":
+        bench_visits(args.seed, args.repeat)
+    elif args.benchmark == "parallel-analysis":
+        bench_parallel_analysis(args.seed, args.repeat, args.workers)
+    elif args.benchmark == "parallel-codegen":
+        bench_parallel_codegen(args.seed, args.repeat, args.workers)
+    elif args.benchmark == "emit":
+        bench_emit(args.seed, args.repeat)
+    elif args.benchmark == "api":
+        bench_api(args.seed, args.repeat, args.programs, args.workers)
+    elif args.benchmark == "fold":
+        bench_fold(args.file, source, args.seed)
@@ -0,0 +1,53 @@
+# thin client for the resident compiler (server.py); only the standard library is imported,
+# so a compile request costs the interpreter startup and one socket round trip
+from argparse import ArgumentParser
+import json, os, socket, sys, tempfile
+
+
+def default_socket():
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"lexic_analizer-{os.getuid()}.sock")
+
+
+def send_request(request, socket_path=None):
+    """Sends a compile request to the server and returns its reply ({"status", "output"})"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path or default_socket())
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+
+def main():
+    request = {
+        "cwd": os.getcwd(),
+        "file": args.file,
+        "debug": args.debug,
+        "lexer": args.lexer,
+        "incremental": args.incremental,
+        "ast_graph": args.ast_graph,
+        "max_errors": args.max_errors,
+    }
+    try:
+        reply = send_request(request, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No compiler server listening on {args.socket or default_socket()}, start it with server.py")
+        sys.exit(2)
+
+    print(reply["output"], end="")
+    sys.exit(reply["status"])
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Client for the resident Por compiler")
+    parser.add_argument("--file", type=str, required=True, help="Input data file")
+    parser.add_argument("--debug", action="store_true", help="Enable compile.out file")
+    parser.add_argument("--lexer", choices=["ply", "dfa"], default="ply", help="Lexer engine")
+    parser.add_argument(
+        "--ast-graph", type=str, default=None, help="Syntax tree graph file (.dot or rendered, e.g. ast.png)"
+    )
+    parser.add_argument("--incremental", action="store_true", help="Reuse unchanged functions from the cache")
+    parser.add_argument("--max-errors", type=int, default=1, help="Errors reported before stopping (0: all)")
+    parser.add_argument("--socket", type=str, default=None, help="Server socket path")
+    args = parser.parse_args()
+    main()
@@ -1,4 +1,6 @@
 from symbol_table import *
+from semantic_analyzer import evaluate_expr_type
+import io, re, sys
 
 # Registers and their usage:
 
@@ -19,379 +21,480 @@ from symbol_table import *
 # %r14 -> General-purpose register, callee-saved.
 # %r15 -> General-purpose register, callee-saved.
 
-label_counter = {
-    "label": 0,
-    "float": 0,
-    "int": 0,
-    "string": 0,
-    "bool": 0,
-    "if": 0,
-    "else": 0,
-    "endif": 0,
-    "while": 0,
-    "endwhile": 0,
-    "for": 0,
-    "endfor": 0,
-}
+# bases of the label names, each one numbered on its own (if_1, if_2, ..., string_1, ...)
+label_bases = ("label", "float", "int", "string", "bool", "if", "else", "endif", "while", "endwhile", "for", "endfor")
 
-labels = {}
+# labels emitted in .rodata, shared by every function that uses the same value
+data_labels = ("string", "float", "int")
 
+# labels of relocatable code are placeholders that link_functions numbers later
+placeholder = re.compile(r"\0(\w+):(\d+)\0")
 
-def new_label(value, base="label"):
-    label_counter[base] += 1
-    labels[value] = [base, f"{base}_{label_counter[base]}"]
-    return list(labels.values())[-1]
 
+class code_context:
+    """State of one code generation: the label numbering, the labels of the .rodata values and
+    the output the assembly is written to.
 
-def generate_code(function_list, local_tables, global_table):
+    Every generation (a whole program, or a chunk of functions for link_functions) owns its
+    context, so generations don't share state and can run side by side, e.g. in worker processes.
+
+    The handlers emit the assembly line by line into a buffer, which is written to the output
+    in one write at the end of every function (flush), so the output gets a few large writes
+    and the memory held stays the one of the largest function whatever the size of the program.
+    """
+
+    def __init__(self, output=None, relocatable=False):
+        self.label_counter = dict.fromkeys(label_bases, 0)
+        self.labels = {}
+        self.output = output if output is not None else io.StringIO()
+        self.relocatable = relocatable
+        self.lines = []
+        # emit(line) appends a line (without its newline) to the buffer, at the cost of a list append
+        self.emit = self.lines.append
+
+    def label_name(self, base, number):
+        if self.relocatable:
+            return f"\0{base}:{number}\0"
+        return f"{base}_{number}"
+
+    def new_label(self, value, base="label"):
+        self.label_counter[base] += 1
+        self.labels[value] = [base, self.label_name(base, self.label_counter[base])]
+        return self.labels[value]
+
+    def flush(self):
+        """Writes the buffered lines to the output"""
+        if self.lines:
+            self.lines.append("")
+            self.output.write("\n".join(self.lines))
+            self.lines.clear()
+
+
+def generate_code(function_list, local_tables, global_table, output=None):
+    """Writes the assembly of the program to output (default: sys.stdout), a function at a time"""
+    ctx = code_context(output if output is not None else sys.stdout)
     for i, function in enumerate(function_list):
-        generate_func(function, local_tables[i], global_table)
-        print()
+        generate_func(function, local_tables[i], global_table, ctx)
+        ctx.emit("")
+        ctx.flush()
 
     # Generate read-only data section
-    generate_rodata()
+    generate_rodata(ctx)
+    ctx.flush()
+
+
+def generate_chunk(function_list, local_tables, global_table):
+    """Generates the code of consecutive functions with their own label numbering.
+
+    Returns the assembly text, with labels left as placeholders, the number of labels
+    created for each base and the values of the data labels, so that link_functions
+    can number them as if the functions had been generated along with the others.
+    """
+    ctx = code_context(relocatable=True)
+    for function, table in zip(function_list, local_tables):
+        generate_func(function, table, global_table, ctx)
+        ctx.emit("")
+        ctx.flush()
+
+    values = [(value, label[0]) for value, label in ctx.labels.items() if label[0] in data_labels]
+    return ctx.output.getvalue(), ctx.label_counter, values
+
+
+def generate_function_chunk(node, table, global_table):
+    """generate_chunk of a single function, as stored by the function cache"""
+    return generate_chunk([node], [table], global_table)
+
+
+def link_functions(chunks, output=None):
+    """Writes chunks generated by generate_chunk, in order, followed by the .rodata section.
+
+    The labels of each chunk are renumbered after the ones of the chunks before it and equal
+    .rodata values share one label, so the result is the same as generating all the functions
+    with generate_code, however they were split in chunks.
+    """
+    ctx = code_context(output if output is not None else sys.stdout)
+    for text, counters, values in chunks:
+        names = {}
+        numbers = dict.fromkeys(data_labels, 0)
+        for value, base in values:
+            numbers[base] += 1
+            if value not in ctx.labels:
+                ctx.new_label(value, base)
+            names[(base, numbers[base])] = ctx.labels[value][1]
+
+        offsets = dict(ctx.label_counter)
+        for base, count in counters.items():
+            if base not in data_labels:
+                ctx.label_counter[base] += count
+
+        def relocate(match):
+            base, number = match.group(1), int(match.group(2))
+            if base in data_labels:
+                return names[(base, number)]
+            return f"{base}_{number + offsets[base]}"
+
+        ctx.output.write(placeholder.sub(relocate, text))
 
+    # Generate read-only data section
+    generate_rodata(ctx)
+    ctx.flush()
 
-def generate_func(node, table, global_table):
-    size = table.return_by_index(-1).offset
 
-    print(f".global {node.value}")
-    print(f"{node.value}:")
-    print(f"    push %rbp")
-    print(f"    mov %rsp, %rbp")
-    print(f"    sub ${size * -1}, %rsp\n")  # Reserve space for local variables
+def generate_func(node, table, global_table, ctx):
+    size = table.frame_size
 
-    for child in node.children[-2].children:
-        generate_assembly(child, table, global_table)
+    ctx.emit(f".global {node.value}")
+    ctx.emit(f"{node.value}:")
+    ctx.emit(f"    push %rbp")
+    ctx.emit(f"    mov %rsp, %rbp")
+    ctx.emit(f"    sub ${size}, %rsp\n")  # Reserve space for local variables
 
+    for child in node.child("body").children:
+        generate_assembly(child, table, global_table, ctx)
 
-def generate_assembly(node, table, global_table):
+
+# every statement handler emits its lines and generate_assembly closes them with an empty line
+
+
+def generate_assembly(node, table, global_table, ctx):
     if node.nodetype == "assignment_expression":
-        code = assignment_handler(node, table)
-        print(code)
+        assignment_handler(node, table, ctx)
+        ctx.emit("")
 
     elif node.nodetype == "declaration":
-        decls_handler(node.children[1], table, global_table)
+        decls_handler(node.child("declarations"), table, global_table, ctx)
 
     elif node.nodetype == "print":
-        code = print_handler(node, table)
-        print(code)
+        print_handler(node, table, ctx)
+        ctx.emit("")
 
     elif node.nodetype in ["binary_expression", "relational_expression", "logical_expression"]:
-        expr_code = expression_handler(node, table)
-        print(expr_code)
+        expression_handler(node, table, ctx.emit)
+        ctx.emit("")
 
     elif node.nodetype == "call_function_expression":
-        if node.children[-2].nodetype == "expression_list":
-            code = call_expression_handler(node.children[-2], table, node.children[0].value)
-        print(code)
+        call_expression_handler(node.child("args"), table, node.child("name").value, ctx)
+        ctx.emit("")
 
     elif node.nodetype == "return_expression":
-        code = return_expression_handler(node, table)
-        print(code)
+        return_expression_handler(node, table, ctx)
+        ctx.emit("")
 
     elif node.nodetype == "increment_expression":
-        code = increment_expression_handler(node, table)
-        print(code)
+        increment_expression_handler(node, table, ctx)
+        ctx.emit("")
 
     elif node.nodetype == "if":
-        if_handler(node, table, global_table)
+        if_handler(node, table, global_table, ctx)
 
     elif node.nodetype == "while":
-        while_handler(node, table, global_table)
+        while_handler(node, table, global_table, ctx)
 
     elif node.nodetype == "for":
-        for_handler(node, table, global_table)
+        for_handler(node, table, global_table, ctx)
 
 
-def assignment_handler(node, table):
-    print(f"    ; {node.children[0].value} = {node.children[2].value}")
-    code = ""
-    var_name = node.children[0].value
-    expr = node.children[2]
+def assignment_handler(node, table, ctx):
+    emit = ctx.emit
+    target = node.child("target")
+    var_name = target.value
+    expr = node.child("expr")
+    emit(f"    ; {var_name} = {expr.value}")
+    offset = table.lookup_node(target).offset
 
     if expr.nodetype == "number":
-        code += f"    movq ${expr.value}, {table.lookup(var_name).offset}(%rbp)\n"
+        emit(f"    movq ${expr.value}, {offset}(%rbp)")
     elif expr.nodetype == "string":
-        if expr.value not in labels:
-            new_label(expr.value, "string")
-        code += f"    lea {labels[expr.value][1]}(%rip), %rax\n"
-        code += f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n"
+        if expr.value not in ctx.labels:
+            ctx.new_label(expr.value, "string")
+        emit(f"    lea {ctx.labels[expr.value][1]}(%rip), %rax")
+        emit(f"    movq %rax, {offset}(%rbp)")
     elif expr.nodetype == "boolean":
         if expr.value == "verdadeiro":
-            code += f"    movb $1, {table.lookup(var_name).offset}(%rbp)\n"
+            emit(f"    movb $1, {offset}(%rbp)")
         else:
-            code += f"    movb $0, {table.lookup(var_name).offset}(%rbp)\n"
-    elif expr.nodetype in ["binary_expression", "logical_expression", "relational_expression"]:
-        code += expression_handler(expr, table)
-        code += f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n"
-
-    return code
+            emit(f"    movb $0, {offset}(%rbp)")
+    elif expr.nodetype in ["identifier", "binary_expression", "logical_expression", "relational_expression"]:
+        expression_handler(expr, table, emit)
+        emit(store_value(expr, table, offset))
 
 
-def decls_handler(node, table, global_table):
+def decls_handler(node, table, global_table, ctx):
+    emit = ctx.emit
     if node.nodetype == "declarations":
-        for child in node.children:
-            if child.nodetype == "atribuition":
-                var_name = node.children[0].value
-                expr = node.children[2]
-
-                if expr.nodetype == "number":
-                    print(f"    ; {node.children[0].value} = {node.children[2].value}")
-                    print(f"    movq ${expr.value}, {table.lookup(var_name).offset}(%rbp)\n")
-
-                elif expr.nodetype == "string":
-                    print(f"    ; {node.children[0].value} = {node.children[2].value}")
-                    if expr.value not in labels:
-                        new_label(expr.value, "string")
-                    print(f"    lea {labels[expr.value][0]}(%rip), %rax")
-                    print(f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n")
-
-                elif expr.nodetype == "boolean":
-                    print(f"    ; {node.children[0].value} = {node.children[2].value}")
-                    if expr.value == "verdadeiro":
-                        print(f"    movb $1, {table.lookup(var_name).offset}(%rbp)\n")
-                    else:
-                        print(f"    movb $0, {table.lookup(var_name).offset}(%rbp)\n")
-
-            if child.nodetype in ["binary_expression", "logical_expression", "relational_expression"]:
-                expr_code = expression_handler(child, table)
-                print(expr_code)
-                print(f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n")
-
-            if child.nodetype == "declarations":
-                decls_handler(child, table, global_table)
-
-
-def print_handler(node, table):
-    print(f"    ; {node.children[0].value} ({node.children[2].value})")
-    code = ""
-    if node.children[2].nodetype == "identifier":
-        var_name = node.children[2].value
-        code += f"    movq {table.lookup(var_name).offset}(%rbp), %rdi\n"
-        code += "    call syscall_print\n"
-    elif node.children[2].nodetype == "string":
-        if node.children[2].value not in labels:
-            new_label(node.children[2].value, "string")
-        code += f"    lea {labels[node.children[2].value][1]}(%rip), %rdi\n"
-        code += "    call syscall_print\n"
-
-    return code
-
-
-def expression_handler(node, table):
+        if node.child("assign") is not None:
+            variable = node.child("name")
+            offset = table.lookup_node(variable).offset
+            expr = node.child("init")
+
+            if expr.nodetype == "number":
+                emit(f"    ; {variable.value} = {expr.value}")
+                emit(f"    movq ${expr.value}, {offset}(%rbp)\n")
+
+            elif expr.nodetype == "string":
+                emit(f"    ; {variable.value} = {expr.value}")
+                if expr.value not in ctx.labels:
+                    ctx.new_label(expr.value, "string")
+                emit(f"    lea {ctx.labels[expr.value][0]}(%rip), %rax")
+                emit(f"    movq %rax, {offset}(%rbp)\n")
+
+            elif expr.nodetype == "boolean":
+                emit(f"    ; {variable.value} = {expr.value}")
+                if expr.value == "verdadeiro":
+                    emit(f"    movb $1, {offset}(%rbp)\n")
+                else:
+                    emit(f"    movb $0, {offset}(%rbp)\n")
+
+            elif expr.nodetype == "identifier":
+                emit(f"    ; {variable.value} = {expr.value}")
+                expression_handler(expr, table, emit)
+                emit(store_value(expr, table, offset) + "\n")
+
+            elif expr.nodetype in ["binary_expression", "logical_expression", "relational_expression"]:
+                expression_handler(expr, table, emit)
+                emit("")
+                emit(store_value(expr, table, offset) + "\n")
+
+        following = node.child("next")
+        if following is not None:
+            decls_handler(following, table, global_table, ctx)
+
+
+def print_handler(node, table, ctx):
+    emit = ctx.emit
+    expr = node.child("expr")
+    emit(f"    ; {node.child('keyword').value} ({expr.value})")
+    if expr.nodetype == "identifier":
+        emit(f"    movq {table.lookup_node(expr).offset}(%rbp), %rdi")
+        emit("    call syscall_print")
+    elif expr.nodetype == "string":
+        if expr.value not in ctx.labels:
+            ctx.new_label(expr.value, "string")
+        emit(f"    lea {ctx.labels[expr.value][1]}(%rip), %rdi")
+        emit("    call syscall_print")
+
+
+def store_value(node, table, offset):
+    """Returns the store of the value of an expression, left in %rax, into a variable.
+
+    The type annotated by the semantic analysis (node.expr_type, typed again when the analysis
+    ran in another process) gives the width: a logico is a byte, as in its slot of the frame.
+    """
+    if evaluate_expr_type(node, table) == "logico":
+        return f"    movb %al, {offset}(%rbp)"
+    return f"    movq %rax, {offset}(%rbp)"
+
+
+def expression_handler(node, table, emit):
+    """Emits the code leaving the value of an expression in %rax"""
     if node.nodetype == "number":
-        return f"    movq ${node.value}, %rax\n"
+        emit(f"    movq ${node.value}, %rax")
 
     elif node.nodetype == "identifier":
-        offset = table.lookup(node.value).offset
-        return f"    movq {offset}(%rbp), %rax\n"
+        offset = table.lookup_node(node).offset
+        if evaluate_expr_type(node, table) == "logico":
+            emit(f"    movzbq {offset}(%rbp), %rax")
+        else:
+            emit(f"    movq {offset}(%rbp), %rax")
+
+    elif node.nodetype == "boolean":
+        emit(f"    movq ${int(node.value == 'verdadeiro')}, %rax")
 
     elif node.nodetype == "binary_expression":
-        left_code = expression_handler(node.children[0], table)
-        right_code = expression_handler(node.children[2], table)
         op = node.value
-
         asm_op = {"+": "addq", "-": "subq", "*": "imulq", "/": "idivq"}.get(op)
 
-        code = left_code
-        code += "    push %rax\n"
-        code += right_code
-        code += "    movq %rax, %rbx\n"  # right operand → %rbx
-        code += "    pop %rax\n"  # left operand → %rax
+        expression_handler(node.child("left"), table, emit)
+        emit("    push %rax")
+        expression_handler(node.child("right"), table, emit)
+        emit("    movq %rax, %rbx")  # right operand → %rbx
+        emit("    pop %rax")  # left operand → %rax
 
         if op == "/":
-            code += "    cqo\n"  # sign-extend %rax into %rdx:%rax
-            code += "    idivq %rbx\n"
+            emit("    cqo")  # sign-extend %rax into %rdx:%rax
+            emit("    idivq %rbx")
         else:
-            code += f"    {asm_op} %rbx, %rax\n"
-
-        return code
+            emit(f"    {asm_op} %rbx, %rax")
 
     elif node.nodetype == "relational_expression":
-        left_code = expression_handler(node.children[0], table)
-        right_code = expression_handler(node.children[2], table)
         op = node.value
-
         set_instr = {"==": "sete", "!=": "setne", "<": "setl", "<=": "setle", ">": "setg", ">=": "setge"}[op]
 
-        code = left_code
-        code += "    push %rax\n"
-        code += right_code
-        code += "    movq %rax, %rbx\n"
-        code += "    pop %rax\n"
-        code += "    cmpq %rbx, %rax\n"
-        code += f"    {set_instr} %al\n"
-        code += "    movzbq %al, %rax\n"
-
-        return code
+        expression_handler(node.child("left"), table, emit)
+        emit("    push %rax")
+        expression_handler(node.child("right"), table, emit)
+        emit("    movq %rax, %rbx")
+        emit("    pop %rax")
+        emit("    cmpq %rbx, %rax")
+        emit(f"    {set_instr} %al")
+        emit("    movzbq %al, %rax")
 
     elif node.nodetype == "logical_expression":
-        left_code = expression_handler(node.children[0], table)
-        right_code = expression_handler(node.children[2], table)
         op = node.value
 
-        code = left_code
-        code += "    push %rax\n"
-        code += right_code
-        code += "    movq %rax, %rbx\n"
-        code += "    pop %rax\n"
+        expression_handler(node.child("left"), table, emit)
+        emit("    push %rax")
+        expression_handler(node.child("right"), table, emit)
+        emit("    movq %rax, %rbx")
+        emit("    pop %rax")
 
         if op == "&&":
-            code += "    andq %rbx, %rax\n"
+            emit("    andq %rbx, %rax")
         elif op == "||":
-            code += "    orq %rbx, %rax\n"
+            emit("    orq %rbx, %rax")
 
-        return code
-
-    return f"    # Unhandled expression: {node.nodetype}\n"
+    else:
+        emit(f"    # Unhandled expression: {node.nodetype}")
 
 
-def call_expression_handler(node, table, func_name):
-    print(f"    ; {func_name}({', '.join([arg.value for arg in node.children])})")
-    code = ""
+def call_expression_handler(node, table, func_name, ctx):
+    emit = ctx.emit
+    args = node.children if node is not None else []
+    emit(f"    ; {func_name}({', '.join([arg.value for arg in args])})")
     arg_regs = ["%rdi", "%rsi", "%rdx", "%rcx", "%r8", "%r9"]
-    args = node.children
-
-    # Store generated expressions temporarily
-    arg_codes = [expression_handler(arg, table) for arg in args]
 
     # Split into register and stack-passed args
-    reg_args = arg_codes[:6]
-    stack_args = arg_codes[6:]
+    reg_args = args[:6]
+    stack_args = args[6:]
 
     # Push stack arguments (right to left)
-    for expr_code in reversed(stack_args):
-        code += expr_code
-        code += "    push %rax\n"
+    for arg in reversed(stack_args):
+        expression_handler(arg, table, emit)
+        emit("    push %rax")
 
     # Move register arguments
-    for i, expr_code in enumerate(reg_args):
-        code += expr_code
-        code += f"    movq %rax, {arg_regs[i]}\n"
+    for i, arg in enumerate(reg_args):
+        expression_handler(arg, table, emit)
+        emit(f"    movq %rax, {arg_regs[i]}")
 
     # Make the function call
-    code += f"    call {func_name}\n"
+    emit(f"    call {func_name}")
 
     # Clean up the stack if any extra args were pushed
     if stack_args:
-        code += f"    addq ${len(stack_args) * 8}, %rsp\n"
-
-    return code
+        emit(f"    addq ${len(stack_args) * 8}, %rsp")
 
 
-def return_expression_handler(node, table):
-    print(f"    ; return")
-    expr_code = expression_handler(node.children[1], table)
-    code = expr_code
-    code += "    leave\n"
-    code += "    ret\n"
-    return code
+def return_expression_handler(node, table, ctx):
+    ctx.emit(f"    ; return")
+    expression_handler(node.child("expr"), table, ctx.emit)
+    ctx.emit("    leave")
+    ctx.emit("    ret")
 
 
-def increment_expression_handler(node, table):
-    print(f"    ; {node.children[0].value} {node.children[1].value}")
-    code = ""
-    var_name = node.children[0].value
-    op = node.children[1].value
+def increment_expression_handler(node, table, ctx):
+    emit = ctx.emit
+    target = node.child("target")
+    var_name = target.value
+    op = node.child("operator").value
+    emit(f"    ; {var_name} {op}")
+    offset = table.lookup_node(target).offset
 
     if op == "++":
-        code += f"    movq {table.lookup(var_name).offset}(%rbp), %rax\n"
-        code += f"    addq $1, %rax\n"
-        code += f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n"
+        emit(f"    movq {offset}(%rbp), %rax")
+        emit(f"    addq $1, %rax")
+        emit(f"    movq %rax, {offset}(%rbp)")
     elif op == "--":
-        code += f"    movq {table.lookup(var_name).offset}(%rbp), %rax\n"
-        code += f"    subq $1, %rax\n"
-        code += f"    movq %rax, {table.lookup(var_name).offset}(%rbp)\n"
-
-    return code
+        emit(f"    movq {offset}(%rbp), %rax")
+        emit(f"    subq $1, %rax")
+        emit(f"    movq %rax, {offset}(%rbp)")
 
 
-def if_handler(node, table, global_table):
-    condition = node.children[1]
-    then_block = node.children[4]
-    else_block = node.children[8] if len(node.children) == 10 else None
+def if_handler(node, table, global_table, ctx):
+    emit = ctx.emit
+    condition = node.child("condition")
+    then_block = node.child("then")
+    else_block = node.child("else")
 
-    else_label = new_label("else", "else")
-    endif_label = new_label("endif", "endif")
+    else_label = ctx.new_label("else", "else")
+    endif_label = ctx.new_label("endif", "endif")
 
-    print(expression_handler(condition, table))
-    print(f"    cmpq $0, %rax")
+    expression_handler(condition, table, emit)
+    emit("")
+    emit(f"    cmpq $0, %rax")
     if else_block:
-        print(f"    je {else_label[1]}\n")
+        emit(f"    je {else_label[1]}\n")
     else:
-        print(f"    je {endif_label[1]}\n")
+        emit(f"    je {endif_label[1]}\n")
 
     for child in then_block.children:
-        generate_assembly(child, table, global_table)
+        generate_assembly(child, table, global_table, ctx)
 
-    print(f"    jmp {endif_label[1]}\n")
+    emit(f"    jmp {endif_label[1]}\n")
     if else_block:
-        print(f"{else_label[1]}:")
+        emit(f"{else_label[1]}:")
 
         for child in else_block.children:
-            generate_assembly(child, table, global_table)
+            generate_assembly(child, table, global_table, ctx)
 
-        print(f"{endif_label[1]}:")
+        emit(f"{endif_label[1]}:")
     else:
-        print(f"{endif_label[1]}:")
+        emit(f"{endif_label[1]}:")
 
 
-def while_handler(node, table, global_table):
-    condition = node.children[1]
-    block = node.children[4]
+def while_handler(node, table, global_table, ctx):
+    emit = ctx.emit
+    condition = node.child("condition")
+    block = node.child("body")
 
-    while_label = new_label("while", "while")
-    endwhile_label = new_label("endwhile", "endwhile")
+    while_label = ctx.new_label("while", "while")
+    endwhile_label = ctx.new_label("endwhile", "endwhile")
 
-    print(f"{while_label[1]}:")
-    print(expression_handler(condition, table))
-    print(f"    cmpq $0, %rax")
-    print(f"    je {endwhile_label[1]}\n")
+    emit(f"{while_label[1]}:")
+    expression_handler(condition, table, emit)
+    emit("")
+    emit(f"    cmpq $0, %rax")
+    emit(f"    je {endwhile_label[1]}\n")
 
     for child in block.children:
-        generate_assembly(child, table, global_table)
+        generate_assembly(child, table, global_table, ctx)
 
-    print(f"    jmp {while_label[1]}\n")
-    print(f"{endwhile_label[1]}:\n")
+    emit(f"    jmp {while_label[1]}\n")
+    emit(f"{endwhile_label[1]}:\n")
 
 
-def for_handler(node, table, global_table):
-    init_expr = node.children[1]
-    condition = node.children[3]
-    step_expr = node.children[5]
-    block = node.children[8]
+def for_handler(node, table, global_table, ctx):
+    emit = ctx.emit
+    init_expr = node.child("init")
+    condition = node.child("condition")
+    step_expr = node.child("step")
+    block = node.child("body")
 
-    for_label = new_label("for", "for")
-    endfor_label = new_label("endfor", "endfor")
+    for_label = ctx.new_label("for", "for")
+    endfor_label = ctx.new_label("endfor", "endfor")
 
-    print(assignment_handler(init_expr, table))
-    print(f"{for_label[1]}:")
-    print(expression_handler(condition, table))
-    print(f"    cmpq $0, %rax")
-    print(f"    je {endfor_label[1]}\n")
+    assignment_handler(init_expr, table, ctx)
+    emit("")
+    emit(f"{for_label[1]}:")
+    expression_handler(condition, table, emit)
+    emit("")
+    emit(f"    cmpq $0, %rax")
+    emit(f"    je {endfor_label[1]}\n")
 
     for child in block.children:
-        generate_assembly(child, table, global_table)
+        generate_assembly(child, table, global_table, ctx)
 
     if step_expr.nodetype == "increment_expression":
-        print(increment_expression_handler(step_expr, table))
+        increment_expression_handler(step_expr, table, ctx)
+        emit("")
     elif step_expr.nodetype == "assignment_expression":
-        print(assignment_handler(step_expr, table))
+        assignment_handler(step_expr, table, ctx)
+        emit("")
 
-    print(f"    jmp {for_label[1]}\n")
-    print(f"{endfor_label[1]}:\n")
+    emit(f"    jmp {for_label[1]}\n")
+    emit(f"{endfor_label[1]}:\n")
 
 
-def generate_rodata():
-    print(".section .rodata")
-    for label, value in labels.items():
+def generate_rodata(ctx):
+    emit = ctx.emit
+    emit(".section .rodata")
+    for label, value in ctx.labels.items():
         if value[0] == "string":
-            print(f"{value[1]}:")
-            print(f"    .string {label}")
+            emit(f"{value[1]}:")
+            emit(f"    .string {label}")
         elif value[0] == "float":
-            print(f"{value[1]}:")
-            print(f"    .float {label}")
+            emit(f"{value[1]}:")
+            emit(f"    .float {label}")
         elif value[0] == "int":
-            print(f"{value[1]}:")
-            print(f"    .int {label}")
+            emit(f"{value[1]}:")
+            emit(f"    .int {label}")
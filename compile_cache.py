@@ -0,0 +1,201 @@
+import contextlib, hashlib, inspect, io, marshal, os, re, sys
+
+# import project modules
+import ASTnode as ast_module
+import symbol_table as symbol_table_module
+import semantic_analyzer
+import code_generator
+import constant_folding
+from ASTnode import ASTnode
+from symbol_table import symbol, symbol_table
+from semantic_analyzer import analyze_function
+from diagnostics import error_log
+from code_generator import generate_function_chunk
+from constant_folding import fold_constants
+from table_cache import user_cache_dir
+
+# Content addressed cache of compiled functions. An entry is keyed by the tokens of the
+# function (types, values and line numbers relative to the function), the signatures of
+# the functions it calls in the global table and the compiler sources, and holds the
+# local symbol table, the diagnostics and the relocatable assembly of the function.
+# A function moved up or down by an edit elsewhere in the file is still a hit: the line
+# numbers of its diagnostics and symbols are shifted to where it is now.
+#
+# A hit must cost less than compiling the function again, so the tokens are recorded as
+# the parser pulls them (token_recorder) instead of walking the tree once more, and the
+# entries are stored with marshal, which loads plain tuples several times faster than
+# pickle loads objects.
+
+line_prefix = re.compile(r"^\[Line (\d+)\]")
+
+
+def compiler_hash():
+    digest = hashlib.sha256()
+    for module in (ast_module, symbol_table_module, semantic_analyzer, constant_folding, code_generator):
+        digest.update(inspect.getsource(module).encode())
+    # and the layout of the entries themselves
+    digest.update(inspect.getsource(sys.modules[__name__]).encode())
+    digest.update(f"marshal {marshal.version}".encode())
+    return digest.hexdigest()[:16]
+
+
+class function_cache:
+    def __init__(self, path=None):
+        self.path = path if path is not None else user_cache_dir("functions", compiler_hash())
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, function, global_table):
+        """Key of a function from its subtree, for a compilation without recorded tokens"""
+        first_line = function.lineno
+        parts = []
+        calls = set()
+
+        stack = [function]
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, ASTnode):
+                parts.append(node)
+                continue
+            # nodes without a line (lineno 0) stay apart from those on the first line
+            line = node.lineno and node.lineno - first_line + 1
+            parts.append((node.nodetype, node.value, line, len(node.children)))
+            if node.nodetype == "call_function_expression":
+                calls.add(node.child("name").value)
+            stack.extend(reversed(node.children))
+
+        return key_digest(parts, calls, global_table)
+
+    def token_keys(self, recorder, function_list, global_table):
+        """Keys of the functions of a program from the tokens recorded while parsing it.
+
+        A function spans from its funcao token to the next one. Returns None when the
+        functions of the tree can't be matched with those spans (after a syntax error).
+        """
+        tokens = recorder.tokens
+        starts = recorder.functions + [len(tokens)]
+        if len(starts) != len(function_list) + 1:
+            return None
+
+        declared = global_table.return_table()
+        keys = []
+        for function, start, stop in zip(function_list, starts, starts[1:]):
+            kinds, values, lines = zip(*tokens[start:stop])
+            if len(values) < 2 or values[1] != function.value:
+                return None
+            first_line = lines[0]
+            parts = [kinds, values, [line - first_line for line in lines]]
+            # every function named in the tokens, the called ones among them
+            keys.append(key_digest(parts, declared.keys() & set(values), global_table))
+        return keys
+
+    def file_name(self, key):
+        return os.path.join(self.path, key[:2], key + ".entry")
+
+    def load(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self.file_name(key), "rb") as file:
+                return marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def store(self, key, record):
+        if self.path is None:
+            return
+        file_name = self.file_name(key)
+        try:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            # written aside and renamed, so concurrent compilations never read a partial entry
+            temp_name = f"{file_name}.{os.getpid()}.tmp"
+            with open(temp_name, "wb") as file:
+                marshal.dump(record, file)
+            os.replace(temp_name, file_name)
+        except OSError:
+            pass
+
+    def compile_function(self, function, global_table, key=None):
+        """Returns the cached compilation of a function, compiling and storing it on a miss.
+
+        The result is a dict with the local symbol table ("table"), the messages of every error the
+        semantic analysis found ("errors", replayed into the error log of the compilation), whether
+        it failed ("failed") and the relocatable assembly ("chunk") produced by generate_function_chunk.
+        key is the one token_keys gave for the function, if any.
+        """
+        if key is None:
+            key = self.key(function, global_table)
+        record = self.load(key)
+        if record is not None:
+            self.hits += 1
+            return entry_from_record(record, function.lineno)
+
+        self.misses += 1
+        entry = {"table": None, "errors": [], "failed": False, "chunk": None}
+        # every error of the function is collected, whatever the error limit of the compilation
+        errors = error_log(max_errors=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            entry["table"] = analyze_function(function, global_table, errors)
+        entry["errors"] = errors.messages
+        entry["failed"] = bool(errors.messages)
+
+        if not entry["failed"]:
+            fold_constants(function, entry["table"])
+            entry["chunk"] = generate_function_chunk(function, entry["table"], global_table)
+
+        self.store(key, record_from_entry(entry, function.lineno))
+        return entry
+
+
+class token_recorder:
+    """Passes the tokens of a lexer on to the parser, keeping their type, value and line for
+    token_keys, along with the index of every funcao token (functions)"""
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.tokens = []
+        self.functions = []
+
+    def token(self):
+        tok = self.lexer.token()
+        if tok is not None:
+            if tok.type == "FUNCTION":
+                self.functions.append(len(self.tokens))
+            self.tokens.append((tok.type, tok.value, tok.lineno))
+        return tok
+
+
+def key_digest(parts, names, global_table):
+    # signatures of the functions named (those called), as declared in the global table
+    declared = global_table.return_table()
+    for name in sorted(names):
+        if name in declared:
+            parts.append((name, repr(declared[name].params)))
+    # marshal version 0 writes every object in full (no references, no interning marks),
+    # so equal parts always give equal bytes
+    return hashlib.sha256(marshal.dumps(parts, 0)).hexdigest()
+
+
+def record_from_entry(entry, line):
+    """The stored form of an entry: plain tuples, with the first line of the function"""
+    table = entry["table"]
+    symbols = [(sym.name, sym.type, sym.lineno, sym.offset, sym.params) for sym in table.entries]
+    return (line, table.return_parent(), symbols, entry["errors"], entry["chunk"])
+
+
+def entry_from_record(record, line):
+    """Rebuilds an entry, with its line numbers shifted to a function now starting at line"""
+    first_line, parent, symbols, messages, chunk = record
+    delta = line - first_line
+    if delta:
+        messages = [
+            line_prefix.sub(lambda match: f"[Line {int(match.group(1)) + delta}]", message, count=1)
+            for message in messages
+        ]
+
+    table = symbol_table(parent=parent)
+    for name, type, lineno, offset, params in symbols:
+        if lineno is not None:
+            lineno += delta
+        table.define(name, symbol(name, type, lineno, offset, params))
+    return {"table": table, "errors": messages, "failed": bool(messages), "chunk": chunk}
@@ -0,0 +1,106 @@
+import contextlib, json, platform, sys, time, tracemalloc
+
+# import project modules
+from ASTnode import ASTnode
+
+# Per phase instrumentation of a compilation, written as a JSON report by --stats.
+#
+# A phase records its wall and CPU time and the change in allocated memory blocks
+# (sys.getallocatedblocks(), which tracks the number of live objects and is cheap enough to read
+# around every function). With trace_memory it also records the peak of the memory traced by
+# tracemalloc while it ran; tracing slows the compilation down about 3x, so the times of such a
+# report are only comparable with each other. A phase entered more than once (e.g. once per
+# function) accumulates its times and keeps the highest peak.
+
+
+def no_phase(name):
+    """Stands for compile_stats.phase when no statistics are collected"""
+    return contextlib.nullcontext()
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, ASTnode):
+            stack.extend(node.children)
+    return count
+
+
+def count_instructions(asm):
+    """Counts the instruction lines of an assembly text (indented, not comments or directives)"""
+    count = 0
+    for line in asm.splitlines():
+        if line[:1].isspace():
+            line = line.strip()
+            count += bool(line) and line[0] not in ";."
+    return count
+
+
+class compile_stats:
+    def __init__(self, file_name, trace_memory=False):
+        self.file_name = file_name
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.counters = {}
+        self.started = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager measuring the code it wraps as the given phase"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        blocks = sys.getallocatedblocks()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            blocks = sys.getallocatedblocks() - blocks
+
+            phase = self.phases.setdefault(
+                name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_traced_bytes": peak, "allocated_blocks": 0}
+            )
+            phase["calls"] += 1
+            phase["wall_s"] += wall
+            phase["cpu_s"] += cpu
+            if peak is not None:
+                phase["peak_traced_bytes"] = max(phase["peak_traced_bytes"], peak)
+            phase["allocated_blocks"] += blocks
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        peaks = [phase["peak_traced_bytes"] for phase in self.phases.values() if self.trace_memory]
+        return {
+            "file": self.file_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "total": {
+                "wall_s": time.perf_counter() - self.start_wall,
+                "cpu_s": time.process_time() - self.start_cpu,
+                "peak_traced_bytes": max(peaks) if peaks else None,
+            },
+            "phases": self.phases,
+            "counters": self.counters,
+        }
+
+    def write(self, file_name):
+        report = self.report()
+        if self.started:
+            tracemalloc.stop()
+        with open(file_name, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+        return report
@@ -0,0 +1,652 @@
+import contextlib, copy, io, multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor
+
+# import project modules
+from tokens import *
+from grammar import *
+from semantic_analyzer import *
+from code_generator import *
+from table_cache import *
+from dfa_lexer import dfa_lexer
+from source_reader import *
+from compile_cache import function_cache, token_recorder
+from flat_ast import ast_arena, flatten
+from constant_folding import fold_constants
+from compile_stats import compile_stats, count_instructions, count_nodes, no_phase
+from diagnostics import ErrorsFound, error_log
+
+# lexer and parser built (or loaded from the table cache) once per process, and worker pools
+warm = {}
+warm_lock = threading.Lock()
+
+# every thread compiles with its own copies of the warm lexer and parser, as these hold the state
+# of the compilation they run; the copies share the master regex and the LALR tables
+local = threading.local()
+
+
+def print_tokens(tokens, debug):
+    for tok in tokens:
+        print(tok, file=debug)
+
+
+def print_table(table, debug):
+    for name, symbol in table.symbols.items():
+        print(f"{name}: {symbol}", file=debug)
+
+
+def get_lexer(engine):
+    lexers = local.__dict__.setdefault("lexers", {})
+    if engine not in lexers:
+        if engine == "dfa":
+            lexers[engine] = dfa_lexer()
+        else:
+            with warm_lock:
+                if engine not in warm:
+                    warm[engine] = build_lexer()
+            lexers[engine] = warm[engine].clone()
+    return lexers[engine]
+
+
+def get_parser():
+    if not hasattr(local, "parser"):
+        with warm_lock:
+            if "parser" not in warm:
+                warm["parser"] = build_parser()
+        local.parser = copy.copy(warm["parser"])
+    return local.parser
+
+
+# job and state of the compilation run by map_forked, inherited by the workers forked for it
+forked_state = None
+
+
+def get_worker_pool(jobs):
+    key = ("workers", jobs)
+    if key not in warm:
+        warm[key] = ProcessPoolExecutor(max_workers=jobs)
+    return warm[key]
+
+
+def can_fork():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def split_ranges(count, jobs):
+    """Splits range(count) in contiguous ranges, a few per worker to even out their sizes"""
+    size = max(1, -(-count // (jobs * 4)))
+    starts = range(0, count, size)
+    return starts, [min(start + size, count) for start in starts]
+
+
+def forked_range(start, stop):
+    job, state = forked_state
+    return job(state, start, stop)
+
+
+def map_forked(job, state, count, jobs):
+    """Runs job(state, start, stop) over the ranges of split_ranges(count, jobs) on workers forked
+    for the call, which inherit state instead of receiving it, and returns the results in order.
+    """
+    global forked_state
+    forked_state = (job, state)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            return list(pool.map(forked_range, *split_ranges(count, jobs)))
+    finally:
+        forked_state = None
+
+
+def analysis_chunk(functions, global_table):
+    """Analyzes functions in a worker process.
+
+    Returns:
+        list: A (local symbol table, error messages) pair per function, in order.
+    """
+    results = []
+    for function in functions:
+        # every error is collected here, the error limit is applied when they are merged
+        errors = error_log(max_errors=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = analyze_function(function, global_table, errors)
+        results.append((table, errors.messages))
+    return results
+
+
+def analysis_range(state, start, stop):
+    function_list, global_table = state
+    return analysis_chunk(function_list[start:stop], global_table)
+
+
+def analysis_job(arena, roots, global_table):
+    return analysis_chunk([arena.node(root) for root in roots], global_table)
+
+
+def analyze_parallel(function_list, global_table, jobs):
+    """Analyzes the functions on worker processes, returning their results in source order.
+
+    After the global table is built each function only reads it and its own subtree. Where
+    processes can be forked, the workers inherit the syntax tree and only get the bounds of
+    their ranges of functions. Otherwise the functions of a range are shipped to a warm pool as
+    the compact copy of their subtrees in a flat arena, which costs more than analyzing them.
+
+    Returns:
+        list: A (local symbol table, error messages) pair per function.
+    """
+    if can_fork():
+        chunks = map_forked(analysis_range, (function_list, global_table), len(function_list), jobs)
+    else:
+        futures = []
+        pool = get_worker_pool(jobs)
+        for start, stop in zip(*split_ranges(len(function_list), jobs)):
+            arena = ast_arena()
+            roots = [flatten(function, arena) for function in function_list[start:stop]]
+            futures.append(pool.submit(analysis_job, arena, roots, global_table))
+        chunks = [future.result() for future in futures]
+    return [result for chunk in chunks for result in chunk]
+
+
+def codegen_range(state, start, stop):
+    function_list, local_tables, global_table = state
+    return generate_chunk(function_list[start:stop], local_tables[start:stop], global_table)
+
+
+def codegen_job(arena, roots, local_tables, global_table):
+    return generate_chunk([arena.node(root) for root in roots], local_tables, global_table)
+
+
+def generate_parallel(function_list, local_tables, global_table, jobs, output):
+    """Generates the code of ranges of functions on worker processes and links the chunks in order.
+
+    Each worker has its own code_context and leaves its labels as placeholders; link_functions
+    numbers them and merges the .rodata values of every chunk, so the assembly is the same as
+    the one of generate_code whatever the number of workers.
+    """
+    if can_fork():
+        chunks = map_forked(codegen_range, (function_list, local_tables, global_table), len(function_list), jobs)
+    else:
+        futures = []
+        pool = get_worker_pool(jobs)
+        for start, stop in zip(*split_ranges(len(function_list), jobs)):
+            arena = ast_arena()
+            roots = [flatten(function, arena) for function in function_list[start:stop]]
+            futures.append(pool.submit(codegen_job, arena, roots, local_tables[start:stop], global_table))
+        chunks = [future.result() for future in futures]
+    link_functions(chunks, output)
+
+
+def compile_file(
+    file_name,
+    lexer_engine="ply",
+    debug_name=os.devnull,
+    ast_graph=None,
+    cache=None,
+    compact_ast=False,
+    flat_ast=False,
+    ast_max_nodes=None,
+    stats=None,
+    max_errors=1,
+    analysis_jobs=1,
+    codegen_jobs=1,
+):
+    """Compiles a Portugol source file into an assembly file next to it.
+
+    Args:
+        file_name (str): Path of the .por source file.
+        lexer_engine (str): Lexer engine, "ply" or "dfa".
+        debug_name (str): File receiving the tokens, AST and symbol tables.
+        ast_graph (str): Write the syntax tree graph to this file: a .dot file is written as
+            DOT text, any other extension (e.g. ast.png) is rendered with graphviz.
+        cache (function_cache): Reuse the compilation of unchanged functions from this cache.
+        compact_ast (bool): Build the compact AST, without punctuation nodes.
+        flat_ast (bool): Build the AST in a flat_ast.ast_arena and run the passes over views of it
+            (slower than over ASTnodes, see flat_ast).
+        ast_max_nodes (int): Cut the syntax tree graph after this many nodes.
+        stats (compile_stats): Record the time and memory of each phase and the compiler counters.
+        max_errors (int): Stop after reporting this many syntax and semantic errors (0: no limit).
+            The errors found are printed and the compilation exits before code generation.
+        analysis_jobs (int): Analyze the functions on this many worker processes (without a cache);
+            the tables and errors are merged in source order, so the result is the same as with 1.
+        codegen_jobs (int): Generate the code of the functions on this many worker processes
+            (without a cache); the assembly is the same as with 1.
+
+    Returns:
+        bool: Whether the .asm file was written (it is left untouched when its content is the same).
+    """
+    phase = stats.phase if stats is not None else no_phase
+    errors = error_log(max_errors)
+
+    # lexer and parser tables, built or loaded on the first compilation of the process
+    with phase("startup"):
+        lexer = get_lexer(lexer_engine)
+        parser = get_parser()
+    lexer.errors = errors
+
+    # run the lexer once over the memory mapped input file, and stream the assembly to the .asm file
+    asm_name = file_name[:-4] + ".asm"
+    with open(debug_name, "w") as debug, changed_file(asm_name) as asm:
+        translate(
+            parser,
+            chunked_lexer(lexer, read_chunks(file_name)),
+            asm,
+            errors,
+            compile_result(),
+            debug=debug if debug_name != os.devnull else None,
+            stats=stats,
+            cache=cache,
+            compact_ast=compact_ast,
+            flat_ast=flat_ast,
+            ast_graph=ast_graph,
+            ast_max_nodes=ast_max_nodes,
+            analysis_jobs=analysis_jobs,
+            codegen_jobs=codegen_jobs,
+        )
+
+        with phase("write"):
+            written = asm.finish()
+
+    if stats is not None:
+        with open(asm_name, "r") as file:
+            stats.count("instructions", count_instructions(file.read()))
+        stats.count("asm_bytes", asm.size)
+
+    return written
+
+
+def translate(
+    parser,
+    tokens_source,
+    output,
+    errors,
+    result,
+    debug=None,
+    stats=None,
+    cache=None,
+    compact_ast=False,
+    flat_ast=False,
+    ast_graph=None,
+    ast_max_nodes=None,
+    analysis_jobs=1,
+    codegen_jobs=1,
+):
+    """Compiles the program read from a token source, writing its assembly to output.
+
+    This is the compilation shared by compile_file and compile_source. Errors go to the error
+    log, which raises ErrorsFound to stop the compilation; the symbol tables are kept in result
+    as soon as they are built, so they are there even then. debug (a file) receives the tokens,
+    the AST and the tables. The other arguments are those of compile_file.
+    """
+    phase = stats.phase if stats is not None else no_phase
+
+    # buffer the tokens when they are printed to the debug file, so they are lexed only once,
+    # or when the statistics time the lexing apart from the parsing
+    if debug is not None or stats is not None:
+        with phase("lexing"):
+            tokens_store = token_store(tokens_source)
+        if debug is not None:
+            print("Tokens:", file=debug)
+            print_tokens(tokens_store, debug)
+        tokens_source = tokens_store.cursor()
+
+    # the function cache keys the functions by their tokens, kept as the parser pulls them
+    if cache is not None:
+        tokens_source = recorder = token_recorder(tokens_source)
+
+    # do the syntax parsing, pulling the tokens as the parser needs them
+    with phase("parsing"):
+        parser.compact = compact_ast
+        parser.arena = ast_arena() if flat_ast else None
+        parser.errorfunc = lambda token: errors.report(syntax_error(token))
+        try:
+            syntaxParsing = parser.parse(lexer=tokens_source)
+        finally:
+            parser.errorfunc = p_error
+        if syntaxParsing is None:
+            # the parser could not resynchronize before the end of the input
+            errors.check()
+        if flat_ast:
+            syntaxParsing = parser.arena.node(syntaxParsing)
+            parser.arena = None
+
+    # print the syntax tree to the debug file
+    if debug is not None:
+        print("AST:", file=debug)
+        syntaxParsing.dump(debug)
+        print(file=debug)
+
+    # write the syntax tree graph
+    if ast_graph is not None:
+        write_graph(syntaxParsing, ast_graph, ast_max_nodes)
+
+    # get the function list from syntax tree
+    function_list = syntaxParsing.child("functions").children
+
+    # define the symbol tables
+    local_tables: list[symbol_table] = result.local_tables
+    with phase("global_table"):
+        global_table = result.global_table = build_global_table(function_list, errors)
+
+    # print the global table to the debug file
+    if debug is not None:
+        print(f"Parent: {global_table.return_parent()}", file=debug)
+        print_table(global_table, debug=debug)
+
+    # iterate through the function list, building each local table during its semantic analysis
+    chunks = []
+    if cache is None and analysis_jobs > 1:
+        with phase("semantic_analysis"):
+            for table, messages in analyze_parallel(function_list, global_table, analysis_jobs):
+                for message in messages:
+                    errors.report(message)
+                local_tables.append(table)
+
+    elif cache is None:
+        for function in function_list:
+            with phase("semantic_analysis"):
+                local_tables.append(analyze_function(function, global_table, errors))
+
+    else:
+        # unchanged functions come straight from the cache, along with their code
+        keys = cache.token_keys(recorder, function_list, global_table) or [None] * len(function_list)
+        for function, key in zip(function_list, keys):
+            with phase("cached_functions"):
+                entry = cache.compile_function(function, global_table, key)
+            for message in entry["errors"]:
+                errors.report(message)
+            local_tables.append(entry["table"])
+            chunks.append(entry["chunk"])
+
+    # print the local tables to the debug file
+    if debug is not None:
+        for table in local_tables:
+            # to get global table function from a local table, do global_table.return_table()[table.return_parent()
+            print(f"Parent: {table.return_parent()}", file=debug)
+            print(f"Details: {global_table.return_table()[table.return_parent()]}", file=debug)
+            print_table(table, debug)
+
+    # no code is generated for a program with errors
+    errors.check()
+
+    # fold the constant expressions of the checked functions (the cache folds the functions it compiles)
+    folded = 0
+    if cache is None:
+        with phase("constant_folding"):
+            for function, table in zip(function_list, local_tables):
+                folded += fold_constants(function, table)
+
+    # the assembly is streamed to the output a function at a time
+    with phase("code_generation"):
+        if cache is not None:
+            link_functions(chunks, output)
+        elif codegen_jobs > 1:
+            generate_parallel(function_list, local_tables, global_table, codegen_jobs, output)
+        else:
+            generate_code(function_list, local_tables, global_table, output)
+
+    if stats is not None:
+        stats.count("tokens", len(tokens_store))
+        stats.count("ast_nodes", count_nodes(syntaxParsing))
+        stats.count("functions", len(function_list))
+        stats.count("global_symbols", len(global_table.symbols))
+        stats.count("local_symbols", sum(len(table.symbols) for table in local_tables))
+        stats.count("folded_expressions", folded)
+        if cache is not None:
+            stats.count("cache_hits", cache.hits)
+            stats.count("cache_misses", cache.misses)
+
+
+class compile_result:
+    """Outcome of compile_source"""
+
+    def __init__(self):
+        self.asm = None  # assembly text, None when the program has errors
+        self.errors = []  # "[Line n]: message" diagnostics, in the order they were found
+        self.warnings = []  # problems that didn't stop the compilation (skipped characters)
+        self.global_table = None
+        self.local_tables = []  # one per function, in source order
+        self.stats = None  # compile_stats report, when asked for
+
+    @property
+    def success(self):
+        return self.asm is not None
+
+
+def compile_source(text, lexer_engine="ply", max_errors=0, compact_ast=False, flat_ast=False, stats=False):
+    """Compiles Portugol source text in memory, for programs embedding the compiler.
+
+    Nothing is printed or written: the assembly, the diagnostics and the symbol tables come back
+    in the result. It can be called over and over, and from several threads at once; each thread
+    compiles with its own copies of the warm lexer and parser.
+
+    Args:
+        text (str): Source of the program.
+        lexer_engine (str): Lexer engine, "ply" or "dfa".
+        max_errors (int): Stop after this many syntax and semantic errors (0: no limit).
+        compact_ast (bool): Build the compact AST, without punctuation nodes.
+        flat_ast (bool): Build the AST in a flat_ast.ast_arena and run the passes over views of it
+            (slower than over ASTnodes, see flat_ast).
+        stats (bool): Put the compile_stats report (phase times and counters) in result.stats.
+
+    Returns:
+        compile_result: The result, with success False when errors were found; errors in the
+            program are never raised.
+    """
+    result = compile_result()
+    stats = compile_stats("<source>") if stats else None
+    phase = stats.phase if stats is not None else no_phase
+    errors = error_log(max_errors, echo=False)
+
+    with phase("startup"):
+        lexer = get_lexer(lexer_engine)
+        parser = get_parser()
+    lexer.errors = errors
+    lexer.lineno = 1
+    lexer.input(text)
+
+    output = io.StringIO()
+    try:
+        translate(parser, lexer, output, errors, result, stats=stats, compact_ast=compact_ast, flat_ast=flat_ast)
+    except ErrorsFound:
+        pass
+    except CompilerError as e:
+        # an error raised by a pass instead of being reported still ends in the diagnostics
+        errors.messages.append(f"{e}")
+    else:
+        result.asm = output.getvalue()
+        if stats is not None:
+            stats.count("instructions", count_instructions(result.asm))
+            stats.count("asm_bytes", len(result.asm))
+
+    result.errors = errors.messages
+    result.warnings = errors.warnings
+    if stats is not None:
+        result.stats = stats.report()
+    return result
+
+
+def write_graph(tree, file_name, max_nodes=None):
+    base, extension = os.path.splitext(file_name)
+    if extension == ".dot":
+        with open(file_name, "w") as file:
+            tree.write_dot(file, max_nodes)
+    else:
+        tree.to_graphviz(max_nodes).render(base, format=extension[1:] or "png", cleanup=True)
+
+
+class changed_file:
+    """Writes the new content of a file as it is produced, keeping the file (and its mtime) when
+    the content is the same, so builds downstream don't rerun.
+
+    The text is compared with the old file as it comes, so neither version is held in memory:
+    from the first difference on it goes to a temporary file, which replaces the old file when
+    finish() is called. Leaving the with block without finish() (e.g. on an error) drops it.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.temp_name = f"{file_name}.{os.getpid()}.tmp"
+        self.size = 0
+        self.new = None
+        try:
+            self.old = open(file_name, "r")
+        except OSError:
+            self.old = None
+            self.new = open(self.temp_name, "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.old is not None:
+            self.old.close()
+        if self.new is not None:
+            self.new.close()
+            os.remove(self.temp_name)
+
+    def write(self, text):
+        if self.new is None and self.old.read(len(text)) != text:
+            self.diverge()
+        if self.new is not None:
+            self.new.write(text)
+        self.size += len(text)
+
+    def diverge(self):
+        # the temporary file starts with the part of the old file that was the same
+        self.new = open(self.temp_name, "w")
+        self.old.seek(0)
+        remaining = self.size
+        while remaining:
+            chunk = self.old.read(min(remaining, 1 << 20))
+            self.new.write(chunk)
+            remaining -= len(chunk)
+
+    def finish(self):
+        """Completes the file, returning whether it was written (False when its content is the same)"""
+        if self.new is None and self.old.read(1) == "":
+            return False
+        if self.new is None:
+            # the old file is longer
+            self.diverge()
+        self.new.close()
+        self.new = None
+        os.replace(self.temp_name, self.file_name)
+        return True
+
+
+def compile_job(file_name, lexer_engine, debug, incremental, compact_ast=False, flat_ast=False, max_errors=1):
+    """Compiles one file of a batch or watch round.
+
+    Returns:
+        tuple: (file name, success, compiler messages, whether the .asm file was written, number of errors)
+    """
+    messages = io.StringIO()
+    debug_name = file_name[:-4] + ".out" if debug else os.devnull
+    cache = function_cache() if incremental else None
+    try:
+        with contextlib.redirect_stdout(messages):
+            written = compile_file(
+                file_name, lexer_engine, debug_name, None, cache, compact_ast, flat_ast, max_errors=max_errors
+            )
+    except ErrorsFound as e:
+        return file_name, False, messages.getvalue(), False, e.count
+    except Exception as e:
+        return file_name, False, messages.getvalue() + f"{type(e).__name__}: {e}\n", False, 1
+    return file_name, True, messages.getvalue(), written, 0
+
+
+def print_result(file_name, success, messages, written, errors=0):
+    status = "ok" if success else "FAILED"
+    if errors:
+        status += f", {errors} error(s)"
+    if success and not written:
+        status += ", .asm unchanged"
+    print(f"[{status}] {file_name}")
+    for line in messages.splitlines():
+        print(f"    {line}")
+
+
+def warm_up(lexer_engine):
+    get_lexer(lexer_engine)
+    get_parser()
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(".por"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def compile_batch(
+    paths,
+    lexer_engine="ply",
+    jobs=None,
+    debug=False,
+    incremental=False,
+    compact_ast=False,
+    flat_ast=False,
+    max_errors=1,
+):
+    """Compiles many files on a process pool and prints a report per file plus a summary.
+
+    Each file is compiled to the end whatever the others report, its diagnostics (up to
+    max_errors of them, 0 for all) listed under it and the errors of every file totalled.
+    """
+    files = collect_files(paths)
+    start = time.perf_counter()
+    failed = 0
+    total_errors = 0
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=warm_up, initargs=(lexer_engine,)) as pool:
+        options = [
+            [option] * len(files) for option in (lexer_engine, debug, incremental, compact_ast, flat_ast, max_errors)
+        ]
+        results = pool.map(compile_job, files, *options)
+        for file_name, success, messages, written, errors in results:
+            print_result(file_name, success, messages, written, errors)
+            failed += not success
+            total_errors += errors
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(files) - failed} compiled, {failed} failed, {total_errors} error(s), {len(files)} files in {elapsed:.2f}s"
+    )
+    return failed == 0
+
+
+def watch(paths, lexer_engine="ply", interval=0.5, incremental=False, compact_ast=False, flat_ast=False, max_errors=1):
+    """Polls the .por files under the given paths and recompiles the ones that changed.
+
+    Files are compared by modification time and size with os.stat, so no external
+    service is needed. The lexer and parser stay warm from one round to the next.
+    """
+    seen = {}
+    print(f"Watching {', '.join(paths)} (Ctrl-C to stop)")
+    try:
+        while True:
+            current = {}
+            for file_name in collect_files(paths):
+                try:
+                    stat = os.stat(file_name)
+                except OSError:
+                    continue
+                current[file_name] = (stat.st_mtime_ns, stat.st_size)
+
+            changed = [file_name for file_name, stamp in current.items() if seen.get(file_name) != stamp]
+            seen = current
+
+            if changed:
+                start = time.perf_counter()
+                for file_name in changed:
+                    print_result(
+                        *compile_job(file_name, lexer_engine, False, incremental, compact_ast, flat_ast, max_errors)
+                    )
+                elapsed = time.perf_counter() - start
+                print(f"Round finished: {len(changed)} file(s) in {elapsed * 1000:.1f} ms", flush=True)
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
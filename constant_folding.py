@@ -0,0 +1,160 @@
+import math, operator
+
+# import project modules
+from ASTnode import ASTnode
+from semantic_analyzer import evaluate_expr_type
+
+# Constant folding and algebraic simplification, run on a function after its semantic analysis
+# and before its code generation. The tree is rewritten in place (ASTnodes and flat AST views
+# alike), so the code generator emits a single movq for a subtree it would otherwise compute
+# with a push/pop sequence per operator.
+#
+# The values follow the rules of the language at run time: inteiro is a 64 bit integer whose
+# division truncates towards zero (idivq) and any real operand makes the result real; logico
+# is 0 or 1. A result is only folded when it can be emitted as is: integers must fit the 32 bit
+# immediate of movq, and divisions by zero are left for the program to fail on.
+#
+# The identities x + 0, x - 0, x * 1, x / 1 (keeping x) and x * 0 (giving 0) are applied to
+# inteiro expressions only, where they are exact; every operand of an arithmetic expression is
+# free of side effects (calls and assignments don't type check there), so x can be dropped.
+
+folded_types = ("binary_expression", "relational_expression", "logical_expression")
+
+binary_operations = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+comparisons = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
+
+def fold_constants(tree, table):
+    """Folds the constant expressions of a function in place, bottom up without recursion.
+
+    table is the local symbol table of the function, which types the operands of the identities
+    (their expr_type is only annotated when the semantic analysis ran in this process).
+
+    Returns:
+        int: The number of expression nodes folded or simplified.
+    """
+    # preorder, so in reverse every operand comes before the expression using it
+    expressions = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ASTnode):
+            if node.nodetype in folded_types:
+                expressions.append(node)
+            stack.extend(node.children)
+    return sum(fold(node, table) for node in reversed(expressions))
+
+
+def fold(node, table):
+    """Folds or simplifies one expression node whose operands were already folded"""
+    op = node.value
+    left = node.child("left")
+    right = node.child("right")
+
+    if node.nodetype == "binary_expression":
+        a, b = number_value(left), number_value(right)
+        if a is not None and b is not None:
+            value = arithmetic(op, a, b)
+            if value is None:
+                return 0
+            replace_constant(node, "number", value)
+            return 1
+        return simplify(node, table, op, left, right, a, b)
+
+    if node.nodetype == "relational_expression":
+        a, b = scalar_value(left), scalar_value(right)
+        if a is None or b is None:
+            return 0
+        value = comparisons[op](a, b)
+
+    else:
+        a, b = boolean_value(left), boolean_value(right)
+        if a is None or b is None:
+            return 0
+        value = a and b if op == "&&" else a or b
+
+    replace_constant(node, "boolean", "verdadeiro" if value else "falso")
+    return 1
+
+
+def number_value(node):
+    if node is not None and node.nodetype == "number":
+        return node.value
+    return None
+
+
+def boolean_value(node):
+    if node is not None and node.nodetype == "boolean":
+        return node.value == "verdadeiro"
+    return None
+
+
+def scalar_value(node):
+    """Value of a number or boolean literal as the comparisons see it (logico is 0 or 1)"""
+    value = boolean_value(node)
+    if value is not None:
+        return int(value)
+    return number_value(node)
+
+
+def arithmetic(op, a, b):
+    """Returns the value of a op b, or None when it can't be folded"""
+    if op == "/" and b == 0:
+        return None
+
+    if isinstance(a, int) and isinstance(b, int):
+        if op == "/":
+            value = abs(a) // abs(b)
+            value = value if (a < 0) == (b < 0) else -value
+        else:
+            value = binary_operations[op](a, b)
+        return value if INT_MIN <= value <= INT_MAX else None
+
+    value = binary_operations[op](float(a), float(b))
+    return value if math.isfinite(value) else None
+
+
+def simplify(node, table, op, left, right, a, b):
+    """Applies the identities of an inteiro expression with one constant operand"""
+    if (a is None and b is None) or evaluate_expr_type(node, table) != "inteiro":
+        return 0
+
+    if op == "*" and (a == 0 or b == 0):
+        replace_constant(node, "number", 0)
+        return 1
+
+    if (b == 0 and op in ("+", "-")) or (b == 1 and op in ("*", "/")):
+        kept = left
+    elif (a == 0 and op == "+") or (a == 1 and op == "*"):
+        kept = right
+    else:
+        return 0
+    if evaluate_expr_type(kept, table) != "inteiro":
+        return 0
+    replace_with(node, kept)
+    return 1
+
+
+def replace_constant(node, nodetype, value):
+    node.nodetype = nodetype
+    node.value = value
+    node.children = []
+
+
+def replace_with(node, other):
+    """Turns node into a copy of other (one of its operands), keeping its own line number"""
+    node.nodetype = other.nodetype
+    node.value = other.value
+    node.children = other.children
+    node.symbol = other.symbol
+    node.expr_type = other.expr_type
@@ -0,0 +1,265 @@
+from ply.lex import LexToken
+
+# import project modules
+from tokens import illegal_character, reserved
+
+# Table driven lexer for the language portugol. It produces the same token
+# stream as the PLY lexer built from tokens.py, but scans the input through a
+# precomputed transition table instead of trying the master regex alternatives.
+
+# character classes
+(
+    OTHER,
+    DIGIT,
+    LETTER,
+    EXP,
+    DOT,
+    PLUS,
+    MINUS,
+    STAR,
+    SLASH,
+    EQ,
+    BANG,
+    LT,
+    GT,
+    AMP,
+    PIPE,
+    LPAREN,
+    RPAREN,
+    LBRACKET,
+    RBRACKET,
+    LBRACE,
+    RBRACE,
+    COMMA,
+    SEMICOLON,
+    QUOTE,
+    NEWLINE,
+    BLANK,
+) = range(26)
+
+NCLASSES = 26
+
+char_classes = {
+    ".": DOT,
+    "+": PLUS,
+    "-": MINUS,
+    "*": STAR,
+    "/": SLASH,
+    "=": EQ,
+    "!": BANG,
+    "<": LT,
+    ">": GT,
+    "&": AMP,
+    "|": PIPE,
+    "(": LPAREN,
+    ")": RPAREN,
+    "[": LBRACKET,
+    "]": RBRACKET,
+    "{": LBRACE,
+    "}": RBRACE,
+    ",": COMMA,
+    ";": SEMICOLON,
+    '"': QUOTE,
+    "\n": NEWLINE,
+    " ": BLANK,
+    "\t": BLANK,
+    "_": LETTER,
+    "E": EXP,
+}
+char_classes.update({c: DIGIT for c in "0123456789"})
+char_classes.update({c: LETTER for c in "abcdefghijklmnopqrstuvwxyzABCDFGHIJKLMNOPQRSTUVWXYZ"})
+
+
+class class_table(dict):
+    """Translation table mapping every character to its class (OTHER when unknown)"""
+
+    def __missing__(self, key):
+        return OTHER
+
+
+translate_table = class_table({ord(c): cls for c, cls in char_classes.items()})
+
+# states, with the token type accepted in each one (None for non accepting states)
+states = [
+    ("DEAD", None),
+    ("START", None),
+    ("NUMBER", "NUMBER"),
+    ("NUMBER_DOT", None),
+    ("NUMBER_FRACTION", "NUMBER"),
+    ("NUMBER_EXP", None),
+    ("NUMBER_EXP_SIGN", None),
+    ("NUMBER_EXP_DIGITS", "NUMBER"),
+    ("ID", "ID"),
+    ("PLUS", "PLUS"),
+    ("INCREMENT", "INCREMENT"),
+    ("MINUS", "MINUS"),
+    ("DECREMENT", "DECREMENT"),
+    ("TIMES", "TIMES"),
+    ("DIVIDE", "DIVIDE"),
+    ("COMMENT", "COMMENT"),
+    ("STRING_OPEN", None),
+    ("STRING", "STRING"),
+    ("ATTRIBUTION", "ATTRIBUTION"),
+    ("EQUAL", "EQUAL"),
+    ("NOT", "NOT"),
+    ("DIFFERENT", "DIFFERENT"),
+    ("LESS_THAN", "LESS_THAN"),
+    ("LESS_EQUAL", "LESS_EQUAL"),
+    ("GREATER_THAN", "GREATER_THAN"),
+    ("GREATER_EQUAL", "GREATER_EQUAL"),
+    ("AMP", None),
+    ("AND", "AND"),
+    ("PIPE", None),
+    ("OR", "OR"),
+    ("LPAREN", "LPAREN"),
+    ("RPAREN", "RPAREN"),
+    ("LBRACKET", "LBRACKET"),
+    ("RBRACKET", "RBRACKET"),
+    ("LBRACE", "LBRACE"),
+    ("RBRACE", "RBRACE"),
+    ("COMMA", "COMMA"),
+    ("SEMICOLON", "SEMICOLON"),
+]
+
+state_ids = {name: idx for idx, (name, _) in enumerate(states)}
+accepts = [kind for _, kind in states]
+
+DEAD = state_ids["DEAD"]
+START = state_ids["START"]
+
+# transitions as (state, character classes, next state); everything else goes to DEAD
+transitions = [
+    ("START", [DIGIT], "NUMBER"),
+    ("START", [LETTER, EXP], "ID"),
+    ("START", [PLUS], "PLUS"),
+    ("START", [MINUS], "MINUS"),
+    ("START", [STAR], "TIMES"),
+    ("START", [SLASH], "DIVIDE"),
+    ("START", [QUOTE], "STRING_OPEN"),
+    ("START", [EQ], "ATTRIBUTION"),
+    ("START", [BANG], "NOT"),
+    ("START", [LT], "LESS_THAN"),
+    ("START", [GT], "GREATER_THAN"),
+    ("START", [AMP], "AMP"),
+    ("START", [PIPE], "PIPE"),
+    ("START", [LPAREN], "LPAREN"),
+    ("START", [RPAREN], "RPAREN"),
+    ("START", [LBRACKET], "LBRACKET"),
+    ("START", [RBRACKET], "RBRACKET"),
+    ("START", [LBRACE], "LBRACE"),
+    ("START", [RBRACE], "RBRACE"),
+    ("START", [COMMA], "COMMA"),
+    ("START", [SEMICOLON], "SEMICOLON"),
+    # number = [+-]? digit+ ([.] digit+)? (E [+-]? digit+)?
+    ("PLUS", [DIGIT], "NUMBER"),
+    ("MINUS", [DIGIT], "NUMBER"),
+    ("NUMBER", [DIGIT], "NUMBER"),
+    ("NUMBER", [DOT], "NUMBER_DOT"),
+    ("NUMBER", [EXP], "NUMBER_EXP"),
+    ("NUMBER_DOT", [DIGIT], "NUMBER_FRACTION"),
+    ("NUMBER_FRACTION", [DIGIT], "NUMBER_FRACTION"),
+    ("NUMBER_FRACTION", [EXP], "NUMBER_EXP"),
+    ("NUMBER_EXP", [PLUS, MINUS], "NUMBER_EXP_SIGN"),
+    ("NUMBER_EXP", [DIGIT], "NUMBER_EXP_DIGITS"),
+    ("NUMBER_EXP_SIGN", [DIGIT], "NUMBER_EXP_DIGITS"),
+    ("NUMBER_EXP_DIGITS", [DIGIT], "NUMBER_EXP_DIGITS"),
+    ("ID", [LETTER, EXP, DIGIT], "ID"),
+    ("PLUS", [PLUS], "INCREMENT"),
+    ("MINUS", [MINUS], "DECREMENT"),
+    ("DIVIDE", [SLASH], "COMMENT"),
+    ("COMMENT", [c for c in range(NCLASSES) if c != NEWLINE], "COMMENT"),
+    # string = ".*" (greedy, the last quote of the line closes it)
+    ("STRING_OPEN", [c for c in range(NCLASSES) if c not in (NEWLINE, QUOTE)], "STRING_OPEN"),
+    ("STRING_OPEN", [QUOTE], "STRING"),
+    ("STRING", [c for c in range(NCLASSES) if c not in (NEWLINE, QUOTE)], "STRING_OPEN"),
+    ("STRING", [QUOTE], "STRING"),
+    ("ATTRIBUTION", [EQ], "EQUAL"),
+    ("NOT", [EQ], "DIFFERENT"),
+    ("LESS_THAN", [EQ], "LESS_EQUAL"),
+    ("GREATER_THAN", [EQ], "GREATER_EQUAL"),
+    ("AMP", [AMP], "AND"),
+    ("PIPE", [PIPE], "OR"),
+]
+
+
+def build_table():
+    table = [DEAD] * (len(states) * NCLASSES)
+    for state, classes, target in transitions:
+        for cls in classes:
+            table[state_ids[state] * NCLASSES + cls] = state_ids[target]
+    return table
+
+
+delta = build_table()
+
+
+class dfa_lexer:
+    """Drop-in replacement for the PLY lexer (input/token interface) driven by the transition table"""
+
+    def __init__(self):
+        self.lexdata = ""
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = 1
+        self.classes = b""
+        self.errors = None
+
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self.lexlen = len(data)
+        self.classes = data.translate(translate_table).encode("latin-1")
+
+    def token(self):
+        data = self.lexdata
+        classes = self.classes
+        length = self.lexlen
+        pos = self.lexpos
+
+        while pos < length:
+            cls = classes[pos]
+            if cls == BLANK:
+                pos += 1
+                continue
+            if cls == NEWLINE:
+                self.lineno += 1
+                pos += 1
+                continue
+
+            # longest match, remembering the last accepting state
+            state = START
+            idx = pos
+            kind = None
+            end = pos
+            while idx < length:
+                state = delta[state * NCLASSES + classes[idx]]
+                if state == DEAD:
+                    break
+                idx += 1
+                if accepts[state] is not None:
+                    kind = accepts[state]
+                    end = idx
+
+            if kind is None:
+                illegal_character(self, data[pos])
+                pos += 1
+                continue
+
+            tok = LexToken()
+            tok.value = data[pos:end]
+            tok.lineno = self.lineno
+            tok.lexpos = pos
+            if kind == "NUMBER":
+                try:
+                    tok.value = int(tok.value)
+                except ValueError:
+                    tok.value = float(tok.value)
+            elif kind == "ID":
+                kind = reserved.get(tok.value, "ID")
+            tok.type = kind
+
+            self.lexpos = end
+            return tok
+
+        self.lexpos = pos
+        return None
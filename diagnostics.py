@@ -0,0 +1,53 @@
+# Diagnostics of one compilation. Every error is printed as soon as it is found, in the usual
+# "[Line n]: message" form, and counted. The compilation stops once max_errors errors were
+# reported: max_errors=1 keeps the stop at the first error, 0 collects every error of the file.
+# Passes that can go on after an error (the parser resynchronizing at the next command, the
+# semantic analysis at the next statement, declaration or function) report it here instead
+# of exiting, and the compiler stops before code generation if anything was reported.
+# Without echo nothing is printed, the messages are only kept (e.g. for compile_source).
+
+
+class ErrorsFound(Exception):
+    """Ends a compilation that reported errors (the command line exits with status 1)"""
+
+    def __init__(self, count):
+        super().__init__(f"{count} error(s) found")
+        self.count = count
+
+
+class error_log:
+    def __init__(self, max_errors=1, echo=True):
+        self.max_errors = max_errors
+        self.echo = echo
+        self.messages = []
+        self.warnings = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def report(self, error):
+        """Prints and counts an error (a CompilerError or its message), stopping at the cap"""
+        message = f"{error}"
+        if self.echo:
+            print(message)
+        self.messages.append(message)
+        if self.max_errors and len(self.messages) >= self.max_errors:
+            self.stop()
+
+    def warn(self, warning):
+        """Prints and keeps a problem that doesn't stop the compilation (e.g. a skipped character)"""
+        message = f"{warning}"
+        if self.echo:
+            print(message)
+        self.warnings.append(message)
+
+    def check(self):
+        """Stops the compilation if any error was reported"""
+        if self.messages:
+            self.stop()
+
+    def stop(self):
+        if self.echo and self.max_errors != 1:
+            capped = " (error limit reached)" if len(self.messages) == self.max_errors else ""
+            print(f"{len(self.messages)} error(s) found{capped}")
+        raise ErrorsFound(len(self.messages))
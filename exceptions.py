@@ -25,6 +25,12 @@ class TypeMismatchError(CompilerError):
     pass
 
 
+class UnknownTypeError(CompilerError):
+    """Raised when a variable or parameter is declared with something that is not a type"""
+
+    pass
+
+
 class InvalidForLoopError(CompilerError):
     """Raised when a for-loop has invalid expressions"""
 
@@ -35,3 +41,9 @@ class ParamCountError(CompilerError):
     """Raised when the number of parameters is incorrect"""
 
     pass
+
+
+class ParseError(CompilerError):
+    """Raised when the parser meets an unexpected token"""
+
+    pass
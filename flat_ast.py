@@ -0,0 +1,177 @@
+from array import array
+
+# import project modules
+from ASTnode import ASTnode, punctuation
+
+# Flat AST: every node lives in a set of parallel typed arrays and is addressed by an
+# integer id. Children are linked through first_child/next_sibling, so walking the ids
+# (children, walk) only reads integers, and the whole tree is dropped (or pickled) as a
+# handful of arrays; this is how the parallel passes ship functions to worker processes.
+#
+# The semantic analysis, constant folding and code generation don't walk the ids: they run
+# over ast_view objects, one per node reached, and run slower than over ASTnodes (from
+# 1.2 up to 4 times, benchmark.py flat-ast). The arena is a compact form to store and ship
+# a tree, not a faster one to compile.
+
+NONE = -1
+
+
+class ast_arena:
+    def __init__(self):
+        self.kinds = array("H")
+        self.values = array("I")
+        self.lines = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+
+        # node types and values are interned; value 0 stands for None
+        self.kind_table = []
+        self.kind_index = {}
+        self.value_table = [None]
+        self.value_index = {}
+
+        # ast_view of each node id, made when a pass first reaches the node and kept, so the
+        # passes don't rebuild the views (and their lists of children) on every access; the
+        # symbols and types the passes annotate live in the views
+        self.views = {}
+
+    def __getstate__(self):
+        # the views are made again on demand, only the arrays and tables are shipped
+        state = dict(self.__dict__)
+        state["views"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind_id(self, nodetype):
+        kind = self.kind_index.get(nodetype)
+        if kind is None:
+            kind = self.kind_index[nodetype] = len(self.kind_table)
+            self.kind_table.append(nodetype)
+        return kind
+
+    def value_id(self, value):
+        if value is None:
+            return 0
+        # the type is part of the key, so 1 and 1.0 are interned separately
+        key = (type(value), value)
+        index = self.value_index.get(key)
+        if index is None:
+            index = self.value_index[key] = len(self.value_table)
+            self.value_table.append(value)
+        return index
+
+    def add(self, nodetype, children=None, value=None, lineno=None):
+        """Adds a node whose children (node ids) were already added, returning its id"""
+        node_id = len(self.kinds)
+        self.kinds.append(self.kind_id(nodetype))
+        self.values.append(self.value_id(value))
+        self.lines.append(NONE if lineno is None else lineno)
+        self.first_child.append(children[0] if children else NONE)
+        self.next_sibling.append(NONE)
+
+        if children:
+            for left, right in zip(children, children[1:]):
+                self.next_sibling[left] = right
+        return node_id
+
+    def children(self, node_id):
+        child = self.first_child[node_id]
+        while child != NONE:
+            yield child
+            child = self.next_sibling[child]
+
+    def walk(self, root):
+        """Yields the ids of a subtree in preorder, without recursion"""
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+        stack = [root]
+        while stack:
+            node_id = stack.pop()
+            yield node_id
+            if node_id != root and next_sibling[node_id] != NONE:
+                stack.append(next_sibling[node_id])
+            if first_child[node_id] != NONE:
+                stack.append(first_child[node_id])
+
+    def node(self, node_id):
+        """Returns the view of a node, the same object on every call"""
+        view = self.views.get(node_id)
+        if view is None:
+            view = self.views[node_id] = ast_view(self, node_id)
+        return view
+
+
+class ast_view(ASTnode):
+    """ASTnode made from an arena node when a pass first reaches it (see ast_arena.node).
+
+    The fields of the node are read from the arena once, into the slots of ASTnode, so the passes
+    read them as fast as on an ASTnode; only the children are listed lazily, on the first access.
+    From then on the view is the node: a pass rewriting the tree (e.g. constant folding) changes
+    the view, and the arena keeps the tree as it was parsed.
+    """
+
+    __slots__ = ("arena", "id", "child_views")
+
+    def __init__(self, arena, node_id):
+        self.arena = arena
+        self.id = node_id
+        self.nodetype = arena.kind_table[arena.kinds[node_id]]
+        self.value = arena.value_table[arena.values[node_id]]
+        lineno = arena.lines[node_id]
+        self.lineno = None if lineno == NONE else lineno
+        self.symbol = None
+        self.expr_type = None
+        self.role_children = None
+        self.child_views = None
+
+    @property
+    def children(self):
+        if self.child_views is None:
+            # arena.node() inlined, this runs once for every node the passes reach
+            arena = self.arena
+            views = arena.views
+            next_sibling = arena.next_sibling
+            children = []
+            child = arena.first_child[self.id]
+            while child != NONE:
+                view = views.get(child)
+                if view is None:
+                    view = views[child] = ast_view(arena, child)
+                children.append(view)
+                child = next_sibling[child]
+            self.child_views = children
+        return self.child_views
+
+    @children.setter
+    def children(self, children):
+        self.child_views = list(children)
+
+
+def flatten(tree, arena):
+    """Copies a subtree (of ASTnodes or views) into an arena without its punctuation nodes.
+
+    The copy is the compact form of the subtree, which is how functions are shipped to other
+    processes: the arena pickles as a few arrays, however deep the subtree is.
+
+    Returns:
+        int: The id of the copied root in the arena.
+    """
+    # breadth first, so the children of nodes[i] are nodes[first[i]:first[i] + count[i]]
+    nodes = [tree]
+    first = []
+    count = []
+    for node in nodes:
+        children = [child for child in node.children if child.nodetype not in punctuation]
+        first.append(len(nodes))
+        count.append(len(children))
+        nodes.extend(children)
+
+    # added from the last one, so every child gets its id before its parent
+    ids = [NONE] * len(nodes)
+    for index in range(len(nodes) - 1, -1, -1):
+        node = nodes[index]
+        children = ids[first[index] : first[index] + count[index]]
+        ids[index] = arena.add(node.nodetype, children, node.value, node.lineno)
+    return ids[0]
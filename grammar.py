@@ -1,8 +1,51 @@
 import ply.yacc as yacc
 from ASTnode import ASTnode
+from tokens import tokens
+from exceptions import ParseError
 
 # !Remember: expression is a tree node, but commands is not
 
+# The parser builds the compact AST when its `compact` attribute is set: pure punctuation
+# (parentheses, braces, commas and semicolons) gets no node, the remaining children keep
+# their order and line numbers. Passes reach children through ASTnode.child(role).
+#
+# When its `arena` attribute holds a flat_ast.ast_arena, nodes are added to the arena and the
+# actions pass integer node ids around instead of ASTnode objects.
+
+
+def node(p, nodetype, children=None, value=None, lineno=None):
+    arena = getattr(p.parser, "arena", None)
+    if arena is not None:
+        return arena.add(nodetype, children, value, lineno)
+    return ASTnode(nodetype, children, value, lineno)
+
+
+def punct(p, nodetype, index):
+    if getattr(p.parser, "compact", False):
+        return None
+    return node(p, nodetype, value=p[index], lineno=p.lineno(index))
+
+
+def compact(children):
+    return [child for child in children if child is not None]
+
+
+# Lists are built by left recursive rules that append to the list of the left hand side, so
+# each item costs O(1) and the parser stack stays shallow. param and declarations are nested
+# nodes in the AST (each one holding the next one as its last child); their rules accumulate
+# (comma, children, lineno) items the same way and nest() folds them once the list is complete.
+
+
+def nest(p, nodetype, items):
+    tail = comma = None
+    for comma_before, children, lineno in reversed(items):
+        if tail is not None:
+            children = children + [comma, tail]
+        tail = node(p, nodetype, children=compact(children), lineno=lineno)
+        comma = comma_before
+    return tail
+
+
 precedence = (
     ("nonassoc", "EQUAL", "DIFFERENT"),
     ("nonassoc", "LESS_THAN", "LESS_EQUAL", "GREATER_THAN", "GREATER_EQUAL"),
@@ -17,20 +60,21 @@ precedence = (
 def p_por_program(p):
     """program : PROGRAM LBRACE function_list RBRACE"""
     children = [
-        ASTnode("LBRACE", value=p[2], lineno=p.lineno(2)),
-        ASTnode("function_list", p[3], lineno=p.lineno(3)),
-        ASTnode("RBRACE", value=p[4], lineno=p.lineno(4)),
+        punct(p, "LBRACE", 2),
+        node(p, "function_list", p[3], lineno=p.lineno(3)),
+        punct(p, "RBRACE", 4),
     ]
-    p[0] = ASTnode("program", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "program", children=compact(children), lineno=p.lineno(1))
 
 
 def p_function_list(p):
     """function_list : function
-    | function function_list"""
+    | function_list function"""
     if len(p) == 2:
         p[0] = [p[1]]
     elif len(p) == 3:
-        p[0] = [p[1]] + p[2]
+        p[1].append(p[2])
+        p[0] = p[1]
 
 
 def p_function(p):
@@ -38,53 +82,55 @@ def p_function(p):
     | FUNCTION ID LPAREN param RPAREN LBRACE commands RBRACE"""
     if len(p) == 8:
         children = [
-            ASTnode("identifier", value=p[2], lineno=p.lineno(2)),
-            ASTnode("LPAREN", value=p[3], lineno=p.lineno(3)),
-            ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
-            ASTnode("LBRACE", value=p[5], lineno=p.lineno(5)),
-            ASTnode("commands", p[6], lineno=p.lineno(6)),
-            ASTnode("RBRACE", value=p[7], lineno=p.lineno(7)),
+            node(p, "identifier", value=p[2], lineno=p.lineno(2)),
+            punct(p, "LPAREN", 3),
+            punct(p, "RPAREN", 4),
+            punct(p, "LBRACE", 5),
+            node(p, "commands", p[6], lineno=p.lineno(6)),
+            punct(p, "RBRACE", 7),
         ]
-        p[0] = ASTnode("function", children=children, value=p[2], lineno=p.lineno(2))
+        p[0] = node(p, "function", children=compact(children), value=p[2], lineno=p.lineno(2))
     elif len(p) == 9:
         children = [
-            ASTnode("identifier", value=p[2], lineno=p.lineno(2)),
-            ASTnode("LPAREN", value=p[3], lineno=p.lineno(3)),
-            p[4],
-            ASTnode("RPAREN", value=p[5], lineno=p.lineno(5)),
-            ASTnode("LBRACE", value=p[6], lineno=p.lineno(6)),
-            ASTnode("commands", p[7], lineno=p.lineno(7)),
-            ASTnode("RBRACE", value=p[8], lineno=p.lineno(8)),
+            node(p, "identifier", value=p[2], lineno=p.lineno(2)),
+            punct(p, "LPAREN", 3),
+            nest(p, "param", p[4]),
+            punct(p, "RPAREN", 5),
+            punct(p, "LBRACE", 6),
+            node(p, "commands", p[7], lineno=p.lineno(7)),
+            punct(p, "RBRACE", 8),
         ]
-        p[0] = ASTnode("function", children=children, value=p[2], lineno=p.lineno(2))
+        p[0] = node(p, "function", children=compact(children), value=p[2], lineno=p.lineno(2))
 
 
 def p_param(p):
     """param : type ID
-    | type ID COMMA param"""
+    | param COMMA type ID"""
     if len(p) == 3:
         children = [
-            ASTnode("type", value=p[1], lineno=p.lineno(1)),
-            ASTnode("identifier", value=p[2], lineno=p.lineno(2)),
+            node(p, "type", value=p[1], lineno=p.lineno(1)),
+            node(p, "identifier", value=p[2], lineno=p.lineno(2)),
         ]
-        p[0] = ASTnode("param", children=children, lineno=p.lineno(1))
+        p[0] = [(None, children, p.lineno(1))]
     elif len(p) == 5:
         children = [
-            ASTnode("type", value=p[1], lineno=p.lineno(1)),
-            ASTnode("identifier", value=p[2], lineno=p.lineno(2)),
-            ASTnode("COMMA", value=p[3], lineno=p.lineno(3)),
-            p[4],
+            node(p, "type", value=p[3], lineno=p.lineno(3)),
+            node(p, "identifier", value=p[4], lineno=p.lineno(4)),
         ]
-        p[0] = ASTnode("param", children=children, lineno=p.lineno(1))
+        p[1].append((punct(p, "COMMA", 2), children, p.lineno(3)))
+        p[0] = p[1]
 
 
 def p_commands(p):
     """commands : command
-    | command commands"""
+    | commands command"""
+    # commands dropped by the error recovery (None) are left out of the list
     if len(p) == 2:
-        p[0] = [p[1]]
+        p[0] = [p[1]] if p[1] is not None else []
     elif len(p) == 3:
-        p[0] = [p[1]] + p[2]
+        if p[2] is not None:
+            p[1].append(p[2])
+        p[0] = p[1]
 
 
 def p_command(p):
@@ -98,6 +144,13 @@ def p_command(p):
     p[0] = p[1]
 
 
+def p_command_error(p):
+    """command : error"""
+    # the parser resynchronizes here after a syntax error: the tokens up to the start of the next
+    # command (or the closing brace of the block) are skipped and the bad command is dropped
+    p[0] = None
+
+
 def p_binary_expression(p):
     """expression : expression PLUS expression
     | expression MINUS expression
@@ -105,15 +158,15 @@ def p_binary_expression(p):
     | expression DIVIDE expression"""
     children = [
         p[1],
-        ASTnode("binary_operator", value=p[2], lineno=p.lineno(2)),
+        node(p, "binary_operator", value=p[2], lineno=p.lineno(2)),
         p[3],
     ]
-    p[0] = ASTnode("binary_expression", children=children, value=p[2], lineno=p.lineno(2))
+    p[0] = node(p, "binary_expression", children=compact(children), value=p[2], lineno=p.lineno(2))
 
 
 def p_expr_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = ASTnode("unary_expression", [p[2]], p.lineno(1))
+    p[0] = node(p, "unary_expression", [p[2]], p.lineno(1))
 
 
 def p_logical_expression(p):
@@ -121,10 +174,10 @@ def p_logical_expression(p):
     | expression OR expression"""
     children = [
         p[1],
-        ASTnode("logical_operator", value=p[2], lineno=p.lineno(2)),
+        node(p, "logical_operator", value=p[2], lineno=p.lineno(2)),
         p[3],
     ]
-    p[0] = ASTnode("logical_expression", children=children, value=p[2], lineno=p.lineno(2))
+    p[0] = node(p, "logical_expression", children=compact(children), value=p[2], lineno=p.lineno(2))
 
 
 def p_relational_expression(p):
@@ -136,20 +189,20 @@ def p_relational_expression(p):
     | expression DIFFERENT expression"""
     children = [
         p[1],
-        ASTnode("relational_operator", value=p[2], lineno=p.lineno(2)),
+        node(p, "relational_operator", value=p[2], lineno=p.lineno(2)),
         p[3],
     ]
-    p[0] = ASTnode("relational_expression", children=children, value=p[2], lineno=p.lineno(2))
+    p[0] = node(p, "relational_expression", children=compact(children), value=p[2], lineno=p.lineno(2))
 
 
 def p_assignment_expression(p):
     """expression : ID ATTRIBUTION expression"""
     children = [
-        ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-        ASTnode("atribuition", value=p[2], lineno=p.lineno(2)),
+        node(p, "identifier", value=p[1], lineno=p.lineno(1)),
+        node(p, "atribuition", value=p[2], lineno=p.lineno(2)),
         p[3],
     ]
-    p[0] = ASTnode("assignment_expression", children=children, value=p[2], lineno=p.lineno(1))
+    p[0] = node(p, "assignment_expression", children=compact(children), value=p[2], lineno=p.lineno(1))
 
 
 def p_expression_group(p):
@@ -159,42 +212,42 @@ def p_expression_group(p):
 
 def p_expression_id(p):
     """expression : ID"""
-    p[0] = ASTnode("identifier", value=p[1], lineno=p.lineno(1))
+    p[0] = node(p, "identifier", value=p[1], lineno=p.lineno(1))
 
 
 def p_expression_number(p):
     """expression : NUMBER"""
-    p[0] = ASTnode("number", value=p[1], lineno=p.lineno(1))
+    p[0] = node(p, "number", value=p[1], lineno=p.lineno(1))
 
 
 def p_expression_boolean(p):
     """expression : TRUE
     | FALSE"""
-    p[0] = ASTnode("boolean", value=p[1], lineno=p.lineno(1))
+    p[0] = node(p, "boolean", value=p[1], lineno=p.lineno(1))
 
 
 def p_expression_string(p):
     """expression : STRING"""
-    p[0] = ASTnode("string", value=p[1], lineno=p.lineno(1))
+    p[0] = node(p, "string", value=p[1], lineno=p.lineno(1))
 
 
 def p_increment_expressionb(p):
     """expression : ID INCREMENT
     | ID DECREMENT"""
     children = [
-        ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-        ASTnode("increment", value=p[2], lineno=p.lineno(2)),
+        node(p, "identifier", value=p[1], lineno=p.lineno(1)),
+        node(p, "increment", value=p[2], lineno=p.lineno(2)),
     ]
-    p[0] = ASTnode("increment_expression", children=children, value=p[2], lineno=p.lineno(1))
+    p[0] = node(p, "increment_expression", children=compact(children), value=p[2], lineno=p.lineno(1))
 
 
 def p_return_expression(p):
     """expression : RETURN expression"""
     children = [
-        ASTnode("RETURN", value=p[1], lineno=p.lineno(1)),
+        node(p, "RETURN", value=p[1], lineno=p.lineno(1)),
         p[2],
     ]
-    p[0] = ASTnode("return_expression", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "return_expression", children=compact(children), lineno=p.lineno(1))
 
 
 def p_call_function_expression(p):
@@ -202,37 +255,38 @@ def p_call_function_expression(p):
     | ID LPAREN expression_list RPAREN"""
     if len(p) == 4:
         children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-            ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
-            ASTnode("RPAREN", value=p[3], lineno=p.lineno(3)),
+            node(p, "identifier", value=p[1], lineno=p.lineno(1)),
+            punct(p, "LPAREN", 2),
+            punct(p, "RPAREN", 3),
         ]
-        p[0] = ASTnode("call_function_expression", children=children, lineno=p.lineno(1))
+        p[0] = node(p, "call_function_expression", children=compact(children), lineno=p.lineno(1))
     else:
         children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-            ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
-            ASTnode("expression_list", p[3], lineno=p.lineno(3)),
-            ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
+            node(p, "identifier", value=p[1], lineno=p.lineno(1)),
+            punct(p, "LPAREN", 2),
+            node(p, "expression_list", p[3], lineno=p.lineno(3)),
+            punct(p, "RPAREN", 4),
         ]
-        p[0] = ASTnode("call_function_expression", children=children, lineno=p.lineno(1))
+        p[0] = node(p, "call_function_expression", children=compact(children), lineno=p.lineno(1))
 
 
 def p_expression_list(p):
     """expression_list : expression
-    | expression COMMA expression_list"""
+    | expression_list COMMA expression"""
     if len(p) == 2:
         p[0] = [p[1]]
     elif len(p) == 4:
-        p[0] = [p[1]] + p[3]
+        p[1].append(p[3])
+        p[0] = p[1]
 
 
 def p_declaration(p):
     """declaration : type declaration_list"""
     children = [
-        ASTnode("type", value=p[1], lineno=p.lineno(1)),
-        p[2],
+        node(p, "type", value=p[1], lineno=p.lineno(1)),
+        nest(p, "declarations", p[2]),
     ]
-    p[0] = ASTnode("declaration", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "declaration", children=compact(children), lineno=p.lineno(1))
 
 
 def p_type(p):
@@ -244,59 +298,50 @@ def p_type(p):
 
 
 def p_declaration_list(p):
-    """declaration_list : ID
-    | ID COMMA declaration_list
-    | ID ATTRIBUTION expression
-    | ID ATTRIBUTION expression COMMA declaration_list"""
+    """declaration_list : declaration_item
+    | declaration_list COMMA declaration_item"""
+    if len(p) == 2:
+        p[0] = [(None, *p[1])]
+    elif len(p) == 4:
+        p[1].append((punct(p, "COMMA", 2), *p[3]))
+        p[0] = p[1]
+
+
+def p_declaration_item(p):
+    """declaration_item : ID
+    | ID ATTRIBUTION expression"""
     if len(p) == 2:
         children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-        ]
-        p[0] = ASTnode("declarations", children=children, lineno=p.lineno(1))
-    elif len(p) == 4 and p[2] == ",":
-        children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-            ASTnode("COMMA", value=p[2], lineno=p.lineno(2)),
-            p[3],
-        ]
-        p[0] = ASTnode("declarations", children=children, lineno=p.lineno(1))
-    elif len(p) == 4 and p[2] == "=":
-        children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-            ASTnode("atribuition", value=p[2], lineno=p.lineno(2)),
-            p[3],
+            node(p, "identifier", value=p[1], lineno=p.lineno(1)),
         ]
-        p[0] = ASTnode("declarations", children=children, lineno=p.lineno(1))
-    elif len(p) == 6:
+    elif len(p) == 4:
         children = [
-            ASTnode("identifier", value=p[1], lineno=p.lineno(1)),
-            ASTnode("atribuition", value=p[2], lineno=p.lineno(2)),
+            node(p, "identifier", value=p[1], lineno=p.lineno(1)),
+            node(p, "atribuition", value=p[2], lineno=p.lineno(2)),
             p[3],
-            ASTnode("COMMA", value=p[4], lineno=p.lineno(4)),
-            p[5],
         ]
-        p[0] = ASTnode("declarations", children=children, lineno=p.lineno(1))
+    p[0] = (children, p.lineno(1))
 
 
 def p_read_statement(p):
     """read_statement : READ LPAREN ID RPAREN"""
     children = [
-        ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
-        ASTnode("identifier", value=p[3], lineno=p.lineno(3)),
-        ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
+        punct(p, "LPAREN", 2),
+        node(p, "identifier", value=p[3], lineno=p.lineno(3)),
+        punct(p, "RPAREN", 4),
     ]
-    p[0] = ASTnode("read", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "read", children=compact(children), lineno=p.lineno(1))
 
 
 def p_write_statement(p):
     """write_statement : PRINT LPAREN expression RPAREN"""
     children = [
-        ASTnode("PRINT", value=p[1], lineno=p.lineno(1)),
-        ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
+        node(p, "PRINT", value=p[1], lineno=p.lineno(1)),
+        punct(p, "LPAREN", 2),
         p[3],
-        ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
+        punct(p, "RPAREN", 4),
     ]
-    p[0] = ASTnode("print", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "print", children=compact(children), lineno=p.lineno(1))
 
 
 def p_if_statement(p):
@@ -304,59 +349,67 @@ def p_if_statement(p):
     | IF LPAREN expression RPAREN LBRACE commands RBRACE ELSE LBRACE commands RBRACE"""
     if len(p) == 8:
         children = [
-            ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
+            punct(p, "LPAREN", 2),
             p[3],
-            ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
-            ASTnode("LBRACE", value=p[5], lineno=p.lineno(5)),
-            ASTnode("commands", p[6], lineno=p.lineno(6)),
-            ASTnode("RBRACE", value=p[7], lineno=p.lineno(7)),
+            punct(p, "RPAREN", 4),
+            punct(p, "LBRACE", 5),
+            node(p, "commands", p[6], lineno=p.lineno(6)),
+            punct(p, "RBRACE", 7),
         ]
-        p[0] = ASTnode("if", children=children, lineno=p.lineno(1))
+        p[0] = node(p, "if", children=compact(children), lineno=p.lineno(1))
     else:
         children = [
-            ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
+            punct(p, "LPAREN", 2),
             p[3],
-            ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
-            ASTnode("LBRACE", value=p[5], lineno=p.lineno(5)),
-            ASTnode("commands", p[6], lineno=p.lineno(6)),
-            ASTnode("RBRACE", value=p[7], lineno=p.lineno(7)),
-            ASTnode("ELSE", value=p[8], lineno=p.lineno(8)),
-            ASTnode("LBRACE", value=p[9], lineno=p.lineno(9)),
-            ASTnode("commands", p[10], lineno=p.lineno(10)),
-            ASTnode("RBRACE", value=p[11], lineno=p.lineno(11)),
+            punct(p, "RPAREN", 4),
+            punct(p, "LBRACE", 5),
+            node(p, "commands", p[6], lineno=p.lineno(6)),
+            punct(p, "RBRACE", 7),
+            node(p, "ELSE", value=p[8], lineno=p.lineno(8)),
+            punct(p, "LBRACE", 9),
+            node(p, "commands", p[10], lineno=p.lineno(10)),
+            punct(p, "RBRACE", 11),
         ]
-        p[0] = ASTnode("if", children=children, lineno=p.lineno(1))
+        p[0] = node(p, "if", children=compact(children), lineno=p.lineno(1))
 
 
 def p_while_statement(p):
     """while_statement : WHILE LPAREN expression RPAREN LBRACE commands RBRACE"""
     children = [
-        ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
+        punct(p, "LPAREN", 2),
         p[3],
-        ASTnode("RPAREN", value=p[4], lineno=p.lineno(4)),
-        ASTnode("LBRACE", value=p[5], lineno=p.lineno(5)),
-        ASTnode("commands", p[6], lineno=p.lineno(6)),
-        ASTnode("RBRACE", value=p[7], lineno=p.lineno(7)),
+        punct(p, "RPAREN", 4),
+        punct(p, "LBRACE", 5),
+        node(p, "commands", p[6], lineno=p.lineno(6)),
+        punct(p, "RBRACE", 7),
     ]
-    p[0] = ASTnode("while", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "while", children=compact(children), lineno=p.lineno(1))
 
 
 def p_for_statement(p):
     """for_statement : FOR LPAREN expression SEMICOLON expression SEMICOLON expression RPAREN LBRACE commands RBRACE"""
     children = [
-        ASTnode("LPAREN", value=p[2], lineno=p.lineno(2)),
+        punct(p, "LPAREN", 2),
         p[3],
-        ASTnode("SEMICOLON", value=p[4], lineno=p.lineno(4)),
+        punct(p, "SEMICOLON", 4),
         p[5],
-        ASTnode("SEMICOLON", value=p[6], lineno=p.lineno(6)),
+        punct(p, "SEMICOLON", 6),
         p[7],
-        ASTnode("RPAREN", value=p[8], lineno=p.lineno(8)),
-        ASTnode("LBRACE", value=p[9], lineno=p.lineno(9)),
-        ASTnode("commands", p[10], lineno=p.lineno(10)),
-        ASTnode("RBRACE", value=p[11], lineno=p.lineno(11)),
+        punct(p, "RPAREN", 8),
+        punct(p, "LBRACE", 9),
+        node(p, "commands", p[10], lineno=p.lineno(10)),
+        punct(p, "RBRACE", 11),
     ]
-    p[0] = ASTnode("for", children=children, lineno=p.lineno(1))
+    p[0] = node(p, "for", children=compact(children), lineno=p.lineno(1))
+
+
+def syntax_error(p):
+    """Returns the ParseError of an unexpected token (None at the end of the input)"""
+    if p is None:
+        return ParseError("Syntax error: unexpected end of input")
+    return ParseError(f"Syntax error at '{p.value}' ({p.type})", p.lineno)
 
 
 def p_error(p):
-    print(f"Syntax error at '{p.value} {p.type} {p.lexpos} '")
+    # compile_file reports syntax errors to its error log through parser.errorfunc instead
+    print(syntax_error(p))
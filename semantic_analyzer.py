@@ -2,52 +2,45 @@ from symbol_table import *
 from ASTnode import ASTnode
 
 
-def semantic_analysis(node, table, global_table):
+def semantic_analysis(node, table, global_table, errors):
     """This function performs semantic analysis in each function in AST, using the local symbol table.
     It checks for type mismatches, undeclared variables, and other semantic errors.
 
+    Errors of a statement are raised as CompilerError; the blocks report them to the error log
+    and go on with the next statement, so one run finds the errors of every statement.
+
     Args:
         node (ASTnode): The AST node to analyze.
         table (symbol_table): The symbol table to use for semantic analysis.
+        errors (error_log): Where the errors of the statements of a block are reported.
     """
     if isinstance(node, ASTnode):
         if node.nodetype == "function":
-            block = next((child for child in node.children if child.nodetype == "commands"), None)
+            block = node.child("body")
             if block:
-                for cmd in block.children:
-                    try:
-                        semantic_analysis(cmd, table, global_table)
-                    except Exception as e:
-                        print(f"{e}")
-                        exit()
+                analyze_block(block, table, global_table, errors)
+
+        # 'declaration' handler: the variables are defined where they are declared
+        elif node.nodetype == "declaration":
+            var_type = node.child("type").value
+            declarations_extract(node.child("declarations"), table, var_type, errors)
 
         # 'assignment_expression' handler
         elif node.nodetype == "assignment_expression":
-            try:
-                declared = table.lookup(node.children[0].value)
-            except SymbolNotFound as e:
-                print(f"[Line {node.children[0].lineno}]: {e}")
-                exit()
-
-            try:
-                expr_type = evaluate_expr_type(node.children[2], table)
-            except TypeMismatchError as e:
-                print(f"{e}")
-                exit()
+            target = node.child("target")
+            declared = lookup_at(table, target)
+            expr_type = evaluate_expr_type(node.child("expr"), table)
 
             if expr_type != declared.type:
                 raise TypeMismatchError(
-                    f"Type mismatch: Symbol [{node.children[0].value}] expected type '{declared.type}' but get type '{expr_type}' instead",
+                    f"Type mismatch: Symbol [{target.value}] expected type '{declared.type}' but get type '{expr_type}' instead",
                     node.lineno,
                 )
 
         # 'increment_expression' handler
         elif node.nodetype == "increment_expression":
-            try:
-                declared = table.lookup(node.children[0].value)
-            except SymbolNotFound as e:
-                print(f"[Line {node.children[0].lineno}]: {e}")
-                exit()
+            target = node.child("target")
+            declared = lookup_at(table, target)
 
             if declared.type != "inteiro":
                 raise TypeMismatchError(
@@ -56,20 +49,31 @@ def semantic_analysis(node, table, global_table):
                 )
 
         elif node.nodetype == "return_expression":
-            try:
-                expr_type = evaluate_expr_type(node.children[1], table)
-            except SymbolNotFound as e:
-                print(f"[Line {node.children[0].lineno}]: {e}")
-                exit()
+            evaluate_expr_type(node.child("expr"), table)
+
+        # 'print' handler: a call is checked as a call, anything else as an expression
+        elif node.nodetype == "print":
+            expr = node.child("expr")
+            if expr.nodetype == "call_function_expression":
+                semantic_analysis(expr, table, global_table, errors)
+            else:
+                evaluate_expr_type(expr, table)
+
+        # 'read' handler: the variable read into must be declared
+        elif node.nodetype == "read":
+            lookup_at(table, node.child("target"))
+
+        # an expression used as a command, e.g. `i + 1`
+        elif node.nodetype in ["binary_expression", "logical_expression", "relational_expression", "identifier"]:
+            evaluate_expr_type(node, table)
 
         elif node.nodetype == "call_function_expression":
-            func_name = node.children[0].value
+            func_name = node.child("name").value
             try:
                 declared = global_table.lookup(func_name)
             except SymbolNotFound as e:
-                print(f"[Line {node.children[0].lineno}]: {e}")
-                exit()
-            params = next((child for child in node.children if child.nodetype == "expression_list"), None)
+                raise SymbolNotFound(f"{e}", node.child("name").lineno) from None
+            params = node.child("args")
             if params:
                 arg_list = args_extract(params.children, table)
             else:
@@ -90,122 +94,143 @@ def semantic_analysis(node, table, global_table):
                         node.lineno,
                     )
 
-        # 'if' and 'while' statement handler
+        # 'if' (both branches) and 'while' statement handler
         elif node.nodetype in ["if", "while"]:
-            condition = node.children[1]
+            # a wrong condition is reported and the block is still checked
+            condition = node.child("condition")
             try:
                 condition_type = evaluate_expr_type(condition, table)
-            except TypeMismatchError as e:
-                print(f"{e}")
-                exit()
+                if condition_type != "logico":
+                    raise TypeMismatchError(
+                        f"Type mismatch: {node.nodetype} Condition must be of type 'logico', but got '{condition_type}' instead'",
+                        node.lineno,
+                    )
+            except CompilerError as e:
+                errors.report(e)
 
-            if condition_type != "logico":
-                raise TypeMismatchError(
-                    f"Type mismatch: {node.nodetype} Condition must be of type 'logico', but got '{condition_type}' instead'",
-                    node.lineno,
-                )
-            block = next((child for child in node.children if child.nodetype == "commands"), None)
-            if block:
-                for cmd in block.children:
-                    try:
-                        semantic_analysis(cmd, table, global_table)
-                    except Exception as e:
-                        print(f"{e}")
-                        exit()
+            blocks = [node.child("then"), node.child("else")] if node.nodetype == "if" else [node.child("body")]
+            for block in blocks:
+                if block:
+                    analyze_block(block, table, global_table, errors)
 
         # 'for' loop handler'
         elif node.nodetype == "for":
-            init_expr = node.children[1]
-            cond_expr = node.children[3]
-            step_expr = node.children[5]
+            init_expr = node.child("init")
+            cond_expr = node.child("condition")
+            step_expr = node.child("step")
 
             # first expression (initialization)
-            if init_expr.nodetype == "assignment_expression":
-                try:
-                    semantic_analysis(init_expr, table, global_table)
-                except Exception as e:
-                    print(f"{e}")
-                    exit()
-            else:
-                raise InvalidForLoopError(
-                    f"Invalid para loop: Invalid initialization expression in [para] loop", init_expr.lineno
-                )
+            try:
+                if init_expr.nodetype == "assignment_expression":
+                    semantic_analysis(init_expr, table, global_table, errors)
+                else:
+                    raise InvalidForLoopError(
+                        f"Invalid para loop: Invalid initialization expression in [para] loop", init_expr.lineno
+                    )
+            except CompilerError as e:
+                errors.report(e)
 
             # second expression (condition)
             try:
                 cond_type = evaluate_expr_type(cond_expr, table)
-            except TypeMismatchError as e:
-                print(f"{e}")
-                exit()
-            if cond_type != "logico":
-                raise TypeMismatchError(
-                    f"Type mismatch: Condition of 'para' loop must be of type 'logico', but got '{cond_type}' instead'",
-                    cond_expr.lineno,
-                )
+                if cond_type != "logico":
+                    raise TypeMismatchError(
+                        f"Type mismatch: Condition of 'para' loop must be of type 'logico', but got '{cond_type}' instead'",
+                        cond_expr.lineno,
+                    )
+            except CompilerError as e:
+                errors.report(e)
 
             # third expression (step)
-            if step_expr.nodetype in ["increment_expression", "assignment_expression"]:
-                try:
-                    semantic_analysis(step_expr, table, global_table)
-                except Exception as e:
-                    print(f"{e}")
-                    exit()
-            else:
-                raise InvalidForLoopError(
-                    f"Invalid para loop: Invalid step expression in [para] loop", step_expr.lineno
-                )
+            try:
+                if step_expr.nodetype in ["increment_expression", "assignment_expression"]:
+                    semantic_analysis(step_expr, table, global_table, errors)
+                else:
+                    raise InvalidForLoopError(
+                        f"Invalid para loop: Invalid step expression in [para] loop", step_expr.lineno
+                    )
+            except CompilerError as e:
+                errors.report(e)
+
+            # the body, whose declarations are defined in the table of the function
+            block = node.child("body")
+            if block:
+                analyze_block(block, table, global_table, errors)
+
 
+def analyze_block(block, table, global_table, errors):
+    """Checks the commands of a block, reporting the error of a command and going on with the next one"""
+    for cmd in block.children:
+        try:
+            semantic_analysis(cmd, table, global_table, errors)
+        except CompilerError as e:
+            errors.report(e)
+
+
+def lookup_at(table, node):
+    """table.lookup_node, a missing symbol being reported at the line of the node"""
+    try:
+        return table.lookup_node(node)
+    except SymbolNotFound as e:
+        raise SymbolNotFound(f"{e}", node.lineno) from None
+
+
+def analyze_function(function, global_table, errors):
+    """Builds the local symbol table of a function and checks it in a single pass.
+
+    Parameters are defined first, then the commands are visited in order: declarations define
+    their variables (offsets included) when they are met and every other command is checked
+    against the symbols defined so far, so a variable used before its declaration is reported
+    as missing.
+
+    Args:
+        errors (error_log): Collects the errors of the function.
+
+    Returns:
+        symbol_table: The local symbol table of the function.
+    """
+    table = symbol_table(parent=function.value)
+    param = function.child("params")
+    if param:
+        params_extract(param, table, errors)
+    semantic_analysis(function, table, global_table, errors)
+    return table
 
-def build_global_table(nodes, table=None):
+
+def build_global_table(nodes, errors, table=None):
     for node in nodes:
         if table is None:
             table = symbol_table(parent="programa")
 
         if isinstance(node, ASTnode):
             if node.nodetype == "function":
-                param = next((child for child in node.children if child.nodetype == "param"), None)
+                param = node.child("params")
                 param_types = param_type_extract(param) if param else []
 
+                # a redeclared function is reported and the first definition is kept
                 try:
                     table.define(
                         node.value,
                         symbol(node.value, "function", node.lineno, params=param_types),
                     )
                 except RedeclarationError as e:
-                    print(f"{e}")
-                    exit()
+                    errors.report(e)
 
     return table
 
 
-def build_local_table(node, table=None, var_type=None):
-    if table is None:
-        table = symbol_table(parent=node.value)
-
-    if isinstance(node, ASTnode):
-        if node.nodetype == "function":
-            param = next((child for child in node.children if child.nodetype == "param"), None)
-
-            if param:
-                params_extract(param, table)
-
-            block = next((child for child in node.children if child.nodetype == "commands"), None)
-            if block:
-                for cmd in block.children:
-                    build_local_table(cmd, table)
-        elif node.nodetype == "declaration":
-            var_type = node.children[0].value
-            decls = node.children[1]
-            try:
-                declarations_extract(decls, table, var_type)
-            except TypeMismatchError as e:
-                print(f"{e}")
-                exit()
+def evaluate_expr_type(expr, table):
+    """Returns the type of an expression, annotating each node of it with its type on the way.
 
-    return table
+    Subexpressions are typed bottom-up and the annotation (node.expr_type) is reused by every
+    later check and by the code generator, so each node is typed once.
+    """
+    if expr.expr_type is None:
+        expr.expr_type = expression_type(expr, table)
+    return expr.expr_type
 
 
-def evaluate_expr_type(expr, table):
+def expression_type(expr, table):
     if expr.nodetype == "number":
         if isinstance(expr.value, int):
             return "inteiro"
@@ -216,19 +241,10 @@ def evaluate_expr_type(expr, table):
     elif expr.nodetype == "boolean":
         return "logico"
     elif expr.nodetype == "identifier":
-        try:
-            sym = table.lookup(expr.value)
-        except SymbolNotFound as e:
-            print(f"[Line {expr.lineno}]: {e}")
-            exit()
-        return sym.type
+        return lookup_at(table, expr).type
     elif expr.nodetype in ["binary_expression", "logical_expression", "relational_expression"]:
-        try:
-            left_type = evaluate_expr_type(expr.children[0], table)
-            right_type = evaluate_expr_type(expr.children[2], table)
-        except TypeMismatchError as e:
-            print(f"{e}")
-            exit()
+        left_type = evaluate_expr_type(expr.child("left"), table)
+        right_type = evaluate_expr_type(expr.child("right"), table)
 
         if expr.nodetype == "binary_expression":
             if left_type and right_type in ["inteiro", "real"]:
@@ -258,78 +274,73 @@ def evaluate_expr_type(expr, table):
         )
 
 
-def declarations_extract(decls, table, var_type):
+def declarations_extract(decls, table, var_type, errors):
+    """Defines the variables of a declaration, checking their initializers.
+
+    The error of one variable is reported and the next ones are still defined, so they don't
+    show up again as missing declarations.
+    """
     if decls.nodetype == "declarations":
-        for idx, child in enumerate(decls.children):
-            if child.nodetype == "identifier":
-                dic = symbol_table.return_table(table)
-                offset = calculate_offset(dic, var_type)
+        name = decls.child("name")
+        assign = decls.child("assign")
+        try:
+            offset = calculate_offset(table, var_type, name.lineno)
+            table.define(name.value, symbol(name.value, var_type, name.lineno, offset=offset))
+            name.symbol = table.lookup(name.value)
+        except CompilerError as e:
+            errors.report(e)
 
-                try:
-                    table.define(child.value, symbol(child.value, var_type, child.lineno, offset=offset))
-                except RedeclarationError as e:
-                    print(f"{e}")
-                    exit()
-            elif child.nodetype == "atribuition":
-                expr = decls.children[idx + 1]
-                try:
-                    expr_type = evaluate_expr_type(expr, table)
-                except TypeMismatchError as e:
-                    print(f"{e}")
-                    exit()
+        if assign is not None:
+            try:
+                expr_type = evaluate_expr_type(decls.child("init"), table)
                 if expr_type != var_type:
                     raise TypeMismatchError(
-                        f"Type mismatch: Symbol [{decls.children[idx - 1].value}] expected type '{var_type}' but get type '{expr_type}' instead",
-                        child.lineno,
+                        f"Type mismatch: Symbol [{name.value}] expected type '{var_type}' but get type '{expr_type}' instead",
+                        assign.lineno,
                     )
-            elif child.nodetype == "declarations":
-                try:
-                    declarations_extract(child, table, var_type)
-                except TypeMismatchError as e:
-                    print(f"{e}")
-                    exit()
+            except CompilerError as e:
+                errors.report(e)
 
+        following = decls.child("next")
+        if following is not None:
+            declarations_extract(following, table, var_type, errors)
 
-def params_extract(param, table):
+
+def params_extract(param, table, errors):
     if param.nodetype == "param":
-        var_type = param.children[0].value
+        var_type = param.child("type").value
+        name = param.child("name")
+        try:
+            offset = calculate_offset(table, var_type, name.lineno)
+            table.define(name.value, symbol(name.value, var_type, name.lineno, offset=offset))
+            name.symbol = table.lookup(name.value)
+        except CompilerError as e:
+            errors.report(e)
+        following = param.child("next")
+        if following is not None:
+            params_extract(following, table, errors)
 
-        dic = symbol_table.return_table(table)
-        offset = calculate_offset(dic, var_type)
 
-        try:
-            table.define(
-                param.children[1].value,
-                symbol(param.children[1].value, var_type, param.children[1].lineno, offset=offset),
-            )
-        except RedeclarationError as e:
-            print(f"{e}")
-            exit()
-        if param.children[-1].nodetype == "param":
-            params_extract(param.children[-1], table)
-
-
-def calculate_offset(dic, var_type):
+def calculate_offset(table, var_type, lineno=None):
     basic_sizes = {
         "inteiro": 4,
         "real": 8,
         "logico": 1,
         "caracter": 1,
-    }[var_type]
-    if not dic:
-        return -basic_sizes
-    else:
-        last_offset = list(dic.values())[-1].offset
-        return last_offset - basic_sizes
+    }
+    if var_type not in basic_sizes:
+        raise UnknownTypeError(f"Unknown type error: {var_type} is not a type", lineno)
+    return table.next_offset(basic_sizes[var_type])
 
 
 def param_type_extract(param, types=None):
     if types is None:
         types = []
     if param.nodetype == "param":
-        types.append(param.children[0].value)
-        if param.children[-1].nodetype == "param":
-            param_type_extract(param.children[-1], types)
+        types.append(param.child("type").value)
+        following = param.child("next")
+        if following is not None:
+            param_type_extract(following, types)
     return types
 
 
@@ -347,13 +358,7 @@ def args_extract(children, table, param_list=None):
             "logical_expression",
             "relational_expression",
         ]:
-            try:
-                id_type = evaluate_expr_type(child, table)
-            except SymbolNotFound as e:
-                print(f"[Line {child.lineno}]: {e}")
-                exit()
-
-            param_list.append(id_type)
+            param_list.append(evaluate_expr_type(child, table))
         elif child.nodetype == "expression_list":
             param_list = args_extract(child.children, table, param_list)
 
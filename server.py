@@ -0,0 +1,78 @@
+# resident compiler: keeps the lexers, the parser and their tables warm and serves
+# compile requests from client.py over a Unix domain socket
+from argparse import ArgumentParser
+import contextlib, io, json, os, signal, socketserver, sys, traceback
+
+# import project modules
+from compiler import *
+from client import default_socket
+
+
+class compile_handler(socketserver.StreamRequestHandler):
+    """Handles one request, in a process forked from the warm server.
+
+    The fork inherits the lexer and parser already built, and keeps the module level
+    state of the compiler (labels, working directory) apart from concurrent requests.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        output = io.StringIO()
+        status = 0
+
+        try:
+            os.chdir(request["cwd"])
+            cache = function_cache() if request.get("incremental") else None
+            debug_name = "compile.out" if request.get("debug") else os.devnull
+            with contextlib.redirect_stdout(output):
+                compile_file(
+                    request["file"],
+                    request.get("lexer", "ply"),
+                    debug_name,
+                    ast_graph=request.get("ast_graph"),
+                    cache=cache,
+                    max_errors=request.get("max_errors", 1),
+                )
+                print("Compilation finished successfully!")
+                if cache is not None:
+                    print(f"Function cache: {cache.hits} hits, {cache.misses} misses")
+        except ErrorsFound:
+            status = 1
+        except Exception:
+            output.write(traceback.format_exc())
+            status = 1
+
+        reply = {"status": status, "output": output.getvalue()}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class compile_server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def serve(socket_path):
+    # build everything a request needs before accepting connections
+    warm_up("ply")
+    warm_up("dfa")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # stop cleanly (removing the socket) on kill as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with compile_server(socket_path, compile_handler) as server:
+        print(f"Compiler server listening on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Resident compiler server for the Por language")
+    parser.add_argument("--socket", type=str, default=None, help="Socket path (default: per user runtime dir)")
+    args = parser.parse_args()
+    serve(args.socket or default_socket())
@@ -0,0 +1,58 @@
+import mmap, os
+
+# Source files are memory mapped and handed to the lexer in chunks that always end
+# at a line break, with their newlines translated as in text mode. No token spans a
+# line break, so the lexer never sees a token cut in half, and the whole file never
+# needs to be decoded into a single str.
+
+CHUNK_SIZE = 1 << 20
+
+
+def read_file(file_name):
+    with open(file_name, "r") as file:
+        return file.read()
+
+
+def read_chunks(file_name, chunk_size=CHUNK_SIZE):
+    """Yields the decoded contents of a source file, one chunk at a time.
+
+    Args:
+        file_name (str): Path of the source file.
+        chunk_size (int): Target size of each chunk in bytes. A chunk is cut at the last
+            line break inside it, or extended to the next one when a line is longer.
+    """
+    with open(file_name, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    cut = buffer.rfind(b"\n", start, end)
+                    if cut == -1:
+                        cut = buffer.find(b"\n", end)
+                    end = size if cut == -1 else cut + 1
+
+                yield translate_newlines(buffer[start:end].decode("utf-8"))
+                release_pages(buffer, start, end)
+                start = end
+
+
+def translate_newlines(text):
+    # the universal newlines of read_file: a chunk ends after a \n, so no \r\n is ever split
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def release_pages(buffer, start, end):
+    # drop the pages already lexed, so the resident size stays bounded by the chunk size
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    start -= start % mmap.PAGESIZE
+    end -= end % mmap.PAGESIZE
+    if end > start:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
@@ -5,6 +5,10 @@ class symbol_table:
     def __init__(self, parent=None):
         self.symbols = {}
         self.parent = parent
+        # symbols in declaration order, and the stack frame size up to the last one with an offset,
+        # kept as symbols are defined so indexed access and offset allocation are constant time
+        self.entries = []
+        self.frame_size = 0
 
     def define(self, name, value):
         if name in self.symbols:
@@ -12,6 +16,9 @@ class symbol_table:
                 f"Redeclaration error: Symbol [{name}] already declared", self.symbols[name].lineno
             )
         self.symbols[name] = value
+        self.entries.append(value)
+        if value.offset is not None:
+            self.frame_size = -value.offset
 
     def lookup(self, name):
         if name in self.symbols:
@@ -19,12 +26,26 @@ class symbol_table:
         else:
             raise SymbolNotFound(f"Missing declaration error: Symbol [{name}] is not declared")
 
+    def lookup_node(self, node):
+        """Returns the symbol of an identifier node, looking it up by name only the first time.
+
+        The symbol is bound to the node (node.symbol), so the passes after the first one to
+        resolve the identifier, usually the semantic analysis, read the binding directly.
+        """
+        if node.symbol is None:
+            node.symbol = self.lookup(node.value)
+        return node.symbol
+
     def return_by_index(self, index):
-        if index < len(self.symbols):
-            return list(self.symbols.values())[index]
+        if index < len(self.entries):
+            return self.entries[index]
         else:
             raise IndexError("Index out of range")
 
+    def next_offset(self, size):
+        """Returns the frame offset of a new local variable of the given size"""
+        return -(self.frame_size + size)
+
     def return_table(self):
         return self.symbols
 
@@ -0,0 +1,80 @@
+import hashlib, importlib.util, inspect, os, sys
+import ply
+import ply.lex as lex
+import ply.yacc as yacc
+
+# import project modules
+import tokens as token_rules
+import grammar as grammar_rules
+
+# The lexer master regex and the LALR tables are stored under a directory named
+# after a hash of the token and grammar definitions, so any edit to tokens.py or
+# grammar.py (or a PLY/Python upgrade) lands in a fresh directory automatically.
+
+LEXTAB = "por_lextab"
+PARSETAB = "por_parsetab.pickle"
+
+
+def definitions_hash():
+    digest = hashlib.sha256()
+    digest.update(f"ply-{ply.__version__} python-{sys.version_info[0]}.{sys.version_info[1]}".encode())
+    digest.update(inspect.getsource(token_rules).encode())
+    digest.update(inspect.getsource(grammar_rules).encode())
+    return digest.hexdigest()[:16]
+
+
+def user_cache_dir(*parts):
+    """Returns (creating it if needed) a directory under the user cache, or None if it can't be created"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "lexic_analizer", *parts)
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return None
+    return path
+
+
+def cache_dir():
+    return user_cache_dir(definitions_hash())
+
+
+def load_lextab(path):
+    file_name = os.path.join(path, LEXTAB + ".py")
+    if not os.path.exists(file_name):
+        return LEXTAB
+
+    spec = importlib.util.spec_from_file_location(LEXTAB, file_name)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        # a truncated or corrupted table is rebuilt from scratch
+        os.remove(file_name)
+        return LEXTAB
+    return module
+
+
+def build_lexer():
+    """Returns the Portugol lexer, loading the master regex from the table cache when possible"""
+    path = cache_dir()
+    if path is None:
+        return lex.lex(module=token_rules)
+
+    return lex.lex(module=token_rules, optimize=True, lextab=load_lextab(path), outputdir=path)
+
+
+def build_parser():
+    """Returns the Portugol parser, loading the LALR tables from the table cache when possible"""
+    path = cache_dir()
+    if path is None:
+        return yacc.yacc(module=grammar_rules, debug=False, write_tables=False)
+
+    picklefile = os.path.join(path, PARSETAB)
+    try:
+        return yacc.yacc(module=grammar_rules, debug=False, picklefile=picklefile)
+    except Exception:
+        if not os.path.exists(picklefile):
+            raise
+        # a truncated or corrupted table is rebuilt from scratch
+        os.remove(picklefile)
+        return yacc.yacc(module=grammar_rules, debug=False, picklefile=picklefile)
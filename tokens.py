@@ -1,5 +1,9 @@
+from array import array
 import ply.lex as lex
 
+# import project modules
+from exceptions import CompilerError
+
 # lexic analysis for the language portugol
 
 # reserved words
@@ -131,11 +135,122 @@ def t_newline(t):
 
 
 def t_error(t):
-    print(f"Illegal character {t.value[0]}")
+    illegal_character(t.lexer, t.value[0])
     t.lexer.skip(1)
 
 
+def illegal_character(lexer, char):
+    """Warns about a skipped character, through the error log of the compilation when it has one"""
+    message = f"Illegal character {char}"
+    errors = getattr(lexer, "errors", None)
+    if errors is None:
+        print(message)
+    else:
+        errors.warn(CompilerError(message, lexer.lineno))
+
+
 def t_ID(t):
     r"[a-zA-Z_][a-zA-Z0-9_]*"
     t.type = reserved.get(t.value, "ID")
     return t
+
+
+# token kinds as small integers, indexed by their position in the tokens list
+token_kinds = {name: kind for kind, name in enumerate(tokens)}
+
+
+class token_store:
+    """Lexes the input once and keeps the tokens (with their positions) in typed columns,
+    so the same stream can be dumped to the debug file and fed to the parser.
+
+    Each token takes one entry in the kind, position, line and value columns; the values
+    themselves are interned, so repeated identifiers and literals are stored only once.
+    """
+
+    def __init__(self, lexer):
+        self.kinds = array("B" if len(tokens) <= 256 else "H")
+        self.positions = array("q")
+        self.lines = array("I")
+        self.values = array("I")
+        self.value_table = []
+        self.value_index = {}
+
+        for tok in iter(lexer.token, None):
+            self.append(tok)
+
+    def append(self, tok):
+        # the type is part of the key, so 1 and 1.0 are interned separately
+        key = (type(tok.value), tok.value)
+        index = self.value_index.get(key)
+        if index is None:
+            index = self.value_index[key] = len(self.value_table)
+            self.value_table.append(tok.value)
+
+        self.kinds.append(token_kinds[tok.type])
+        self.positions.append(tok.lexpos)
+        self.lines.append(tok.lineno)
+        self.values.append(index)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        tok = lex.LexToken()
+        tok.type = tokens[self.kinds[index]]
+        tok.value = self.value_table[self.values[index]]
+        tok.lineno = self.lines[index]
+        tok.lexpos = self.positions[index]
+        return tok
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def cursor(self):
+        return token_cursor(self)
+
+
+class token_cursor:
+    """Walks a token store through the lexer interface expected by yacc"""
+
+    def __init__(self, store):
+        self.store = store
+        self.index = 0
+
+    def token(self):
+        if self.index >= len(self.store):
+            return None
+        tok = self.store[self.index]
+        self.index += 1
+        return tok
+
+
+class chunked_lexer:
+    """Runs a lexer over a sequence of chunks as if they were a single input.
+
+    Chunks must end at a line break, so no token is split between two of them.
+    The line number carries over from one chunk to the next and token positions
+    are shifted to be relative to the start of the whole input.
+    """
+
+    def __init__(self, lexer, chunks):
+        self.lexer = lexer
+        self.chunks = iter(chunks)
+        self.base = 0
+        self.size = 0
+        self.lexer.lineno = 1
+        self.lexer.input("")
+
+    def token(self):
+        while True:
+            tok = self.lexer.token()
+            if tok is not None:
+                tok.lexpos += self.base
+                return tok
+
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return None
+            self.base += self.size
+            self.size = len(chunk)
+            self.lexer.input(chunk)
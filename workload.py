@@ -0,0 +1,158 @@
+# seeded generator of synthetic Portugol programs, to stress the compiler beyond ex1.por
+from argparse import ArgumentParser
+import random
+
+# The programs stay inside what the compiler accepts end to end: every variable is an inteiro
+# declared at the top of its function (so it is declared before any use, in any nested block),
+# operators are surrounded by spaces (NUMBER takes a leading sign, so "a+1" lexes as ID NUMBER),
+# subexpressions are parenthesized (&& and || bind tighter than the relational operators),
+# call arguments are plain identifiers and the called functions always take parameters.
+
+
+class program_generator:
+    def __init__(self, functions=10, statements=20, depth=2, declarations=5, fanout=2, seed=0):
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.declarations = declarations
+        self.fanout = fanout
+        self.rng = random.Random(seed)
+        self.lines = []
+
+        # inicio takes no parameters, the other functions 1 to 3 inteiro parameters
+        self.names = ["inicio"] + [f"f{index}" for index in range(1, functions)]
+        self.params = [0] + [self.rng.randint(1, 3) for _ in range(1, functions)]
+
+    def emit(self, level, text):
+        self.lines.append("  " * level + text)
+
+    def operand(self, variables):
+        if self.rng.random() < 0.7:
+            return self.rng.choice(variables)
+        return str(self.rng.randint(0, 99))
+
+    def expression(self, variables, depth):
+        if depth == 0:
+            return self.operand(variables)
+        operator = self.rng.choice("+-*/")
+        left = self.expression(variables, depth - 1)
+        right = self.expression(variables, self.rng.randrange(depth))
+        return f"({left} {operator} {right})"
+
+    def condition(self, variables):
+        operator = self.rng.choice(["<", "<=", ">", ">=", "==", "!="])
+        condition = f"({self.expression(variables, self.depth)} {operator} {self.operand(variables)})"
+        if self.rng.random() < 0.3:
+            other = self.rng.choice(["<", ">"])
+            condition = f"({condition} {self.rng.choice(['&&', '||'])} ({self.operand(variables)} {other} 0))"
+        return condition
+
+    def call(self, variables, level, callees):
+        callee = self.rng.choice(callees)
+        args = ", ".join(self.rng.choice(variables) for _ in range(self.params[callee]))
+        self.emit(level, f"{self.names[callee]}({args})")
+
+    def block(self, variables, level, budget, callees):
+        """Emits budget statements (nested ones included), returning the calls left to place"""
+        while budget > 0:
+            kind = self.rng.random()
+            target = self.rng.choice(variables)
+            if kind < 0.1 and callees:
+                self.call(variables, level, callees)
+                budget -= 1
+            elif kind < 0.2 and budget >= 3 and level < 6:
+                inner = self.rng.randint(1, min(budget - 1, 8))
+                structure = self.rng.choice(["se", "enquanto", "para"])
+                if structure == "se":
+                    self.emit(level, f"se ({self.condition(variables)}) {{")
+                elif structure == "enquanto":
+                    self.emit(level, f"enquanto ({self.condition(variables)}) {{")
+                else:
+                    self.emit(level, f"para({target} = 0; {target} < {self.rng.randint(1, 99)}; {target}++) {{")
+                self.block(variables, level + 1, inner, callees)
+                self.emit(level, "}")
+                budget -= inner + 1
+            elif kind < 0.3:
+                self.emit(level, f"{target}{self.rng.choice(['++', '--'])}")
+                budget -= 1
+            elif kind < 0.4:
+                if self.rng.random() < 0.5:
+                    self.emit(level, f"escreva({target})")
+                else:
+                    self.emit(level, f'escreva("message {self.rng.randint(0, 999)}")')
+                budget -= 1
+            else:
+                self.emit(level, f"{target} = {self.expression(variables, self.depth)}")
+                budget -= 1
+
+    def function(self, index):
+        params = [f"p{number}" for number in range(self.params[index])]
+        signature = ", ".join(f"inteiro {param}" for param in params)
+        self.emit(1, f"funcao {self.names[index]}({signature}) {{")
+
+        # declarations in groups of up to 4 names, initialized from the names declared before them
+        variables = list(params)
+        names = [f"v{number}" for number in range(max(self.declarations, 1))]
+        for start in range(0, len(names), 4):
+            items = []
+            for name in names[start : start + 4]:
+                choice = self.rng.random()
+                if choice < 0.4:
+                    items.append(f"{name} = {self.rng.randint(0, 99)}")
+                elif choice < 0.7 and variables:
+                    items.append(f"{name} = {self.expression(variables, self.depth)}")
+                else:
+                    items.append(name)
+                variables.append(name)
+            self.emit(2, "inteiro " + ", ".join(items))
+
+        # fanout distinct functions with parameters are called from each function
+        others = [callee for callee in range(1, self.functions) if callee != index]
+        callees = self.rng.sample(others, min(self.fanout, len(others)))
+        for callee in callees:
+            self.call(variables, 2, [callee])
+
+        self.block(variables, 2, self.statements, callees)
+        if index > 0:
+            self.emit(2, f"retorne {self.expression(variables, self.depth)}")
+        self.emit(1, "}")
+
+    def generate(self):
+        self.lines = ["programa {"]
+        for index in range(self.functions):
+            self.function(index)
+        self.lines.append("}")
+        return "\n".join(self.lines) + "\n"
+
+
+def generate_program(functions=10, statements=20, depth=2, declarations=5, fanout=2, seed=0):
+    """Returns the source of a valid Portugol program, the same for the same arguments.
+
+    Args:
+        functions (int): Number of functions, inicio included.
+        statements (int): Statements per function, the ones nested in se/enquanto/para included.
+        depth (int): Depth of the arithmetic expression trees.
+        declarations (int): Variables declared per function, besides the parameters.
+        fanout (int): Distinct functions each function calls.
+        seed (int): Seed of the random choices.
+    """
+    return program_generator(functions, statements, depth, declarations, fanout, seed).generate()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generates a synthetic Portugol program")
+    parser.add_argument("--functions", type=int, default=10, help="Number of functions")
+    parser.add_argument("--statements", type=int, default=20, help="Statements per function")
+    parser.add_argument("--depth", type=int, default=2, help="Expression depth")
+    parser.add_argument("--declarations", type=int, default=5, help="Variables declared per function")
+    parser.add_argument("--fanout", type=int, default=2, help="Functions called by each function")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", type=str, default=None, help="Output .por file (default: standard output)")
+    args = parser.parse_args()
+
+    source = generate_program(args.functions, args.statements, args.depth, args.declarations, args.fanout, args.seed)
+    if args.output is None:
+        print(source, end="")
+    else:
+        with open(args.output, "w") as file:
+            file.write(source)